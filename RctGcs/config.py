@@ -7,6 +7,7 @@ from configparser import ConfigParser
 from enum import Enum
 from pathlib import Path
 from socket import gaierror, gethostbyname
+from tempfile import NamedTemporaryFile
 from typing import Any, Dict, Tuple
 
 from appdirs import AppDirs
@@ -93,8 +94,18 @@ class Configuration:
         """
         parser = ConfigParser()
         parser.read_dict(self.__create_dict())
-        with open(self.__config_path, 'w', encoding='ascii') as handle:
+        # Write next to the config file and rename over it, so that a crash
+        # mid-write never leaves a truncated config behind
+        config_path = Path(self.__config_path)
+        with NamedTemporaryFile('w', encoding='ascii', dir=config_path.parent,
+                                prefix=config_path.name, suffix='.tmp',
+                                delete=False) as handle:
             parser.write(handle)
+        try:
+            os.replace(handle.name, config_path)
+        except OSError:
+            os.unlink(handle.name)
+            raise
 
     @property
     def connection_port(self) -> int:
@@ -69,10 +69,11 @@ def get_ips():
     ip = set()
 
     ip.add(socket.gethostbyname_ex(socket.gethostname())[2][0])
-    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    s.connect(('8.8.8.8', 53))
-    ip.add(s.getsockname()[0])
-    s.close()
+    # Connecting a UDP socket sends nothing, it only selects the outbound
+    # interface.  The context manager closes it even if connect fails.
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.connect(('8.8.8.8', 53))
+        ip.add(s.getsockname()[0])
     return ip
 
 
@@ -98,6 +99,7 @@ class DroneSim:
         :param port:
         '''
         self.__tx_thread = None
+        self.__tx_stop_event = threading.Event()
         self.__mission_thread = None
         self.__end_mission_event = None
         self.port = port
@@ -439,6 +441,7 @@ class DroneSim:
         #self.reset()
         self.port.start()
         self.HS_run = True
+        self.__tx_stop_event.clear()
         self.__tx_thread = threading.Thread(target=self.__sender)
         self.__tx_thread.start()
 
@@ -447,6 +450,7 @@ class DroneSim:
         Stops the simulator.  This is equivalent to turning off the payload.
         '''
         self.HS_run = False
+        self.__tx_stop_event.set()
         if self.__tx_thread is not None:
             self.__tx_thread.join()
             self.port.stop()
@@ -613,7 +617,10 @@ class DroneSim:
                                                  self.__state['STS_dir_status'],
                                                  self.__state['STS_sw_status'])
             self.port.sendToAll(packet)
-            time.sleep(self.SC_heartbeat_period)
+            # Wakes immediately when stop() is called instead of finishing
+            # out the heartbeat period
+            if self.__tx_stop_event.wait(self.SC_heartbeat_period):
+                break
 
     def transmit_position(self):
         '''
@@ -662,20 +669,21 @@ class DroneSim:
         self.SS_vehicle_target = np.array(self.SM_takeoff_target)
         self.SS_waypoint_idx = 0
 
-        prev_pos_time = prev_ping_time = prev_time = self.SS_start_time
-        wp_time = self.SS_start_time
+        # Loop timing uses the monotonic clock as plain float seconds, the wall
+        # clock is only read for the ping timestamps
+        prev_pos_time = prev_ping_time = prev_time = time.monotonic()
+        # The target only changes on state transitions, so its lat/lon is
+        # converted once per target rather than once per ping
+        target_utm = None
+        latT = lonT = None
         while self.SM_mission_run:
             #######################
             # Loop time variables #
             #######################
             # Current time
-            cur_time = dt.datetime.now()
-            # Time since mission start
-            el_time = (cur_time - self.SS_start_time).total_seconds()
+            cur_time = time.monotonic()
             # Time since last loop
-            it_time = (cur_time - prev_time).total_seconds()
-            # Time since last waypoint
-            seg_time = (cur_time - wp_time).total_seconds()
+            it_time = cur_time - prev_time
 
             ########################
             # Flight State Machine #
@@ -691,7 +699,6 @@ class DroneSim:
                     self.SS_vehicle_state = DroneSim.MISSION_STATE.WAYPOINTS
                     self.SS_vehicle_target = np.array(
                         self.SM_waypoints[self.SS_waypoint_idx])
-                    wp_time = dt.datetime.now()
 
             elif self.SS_vehicle_state == DroneSim.MISSION_STATE.WAYPOINTS:
                 target_vector = self.SS_vehicle_target - self.SS_vehicle_position
@@ -701,7 +708,6 @@ class DroneSim:
                 self.SS_vehicle_position += self.SS_velocity_vector * it_time
                 if distance_to_target < self.SM_target_threshold:
                     self.SS_velocity_vector = np.array([0, 0, 0])
-                    wp_time = dt.datetime.now()
 
                     self.SS_waypoint_idx += 1
                     self.SS_vehicle_state = DroneSim.MISSION_STATE.SPIN
@@ -727,7 +733,6 @@ class DroneSim:
                 self.SS_vehicle_position += self.SS_velocity_vector * it_time
                 if distance_to_target < self.SM_target_threshold:
                     self.SS_velocity_vector = np.array([0, 0, 0])
-                    wp_time = dt.datetime.now()
 
                     self.SS_vehicle_state = DroneSim.MISSION_STATE.LAND
                     #self.SS_vehicle_target = np.array(self.SM_end)
@@ -740,7 +745,6 @@ class DroneSim:
                     self.SS_vehicle_target - self.SS_vehicle_position)
                 if distance_to_target < self.SM_target_threshold:
                     self.SS_velocity_vector = np.array([0, 0, 0])
-                    wp_time = dt.datetime.now()
                     self.SS_vehicle_state = DroneSim.MISSION_STATE.END
             else:
                 if return_on_end:
@@ -758,11 +762,16 @@ class DroneSim:
             ###################
             # Ping Simulation #
             ###################
-            if (cur_time - prev_ping_time).total_seconds() > self.SC_ping_measurement_period:
+            if cur_time - prev_ping_time > self.SC_ping_measurement_period:
                 lat, lon = utm.to_latlon(
                     self.SS_vehicle_position[0], self.SS_vehicle_position[1], self.SM_utm_zone_num, self.SM_utm_zone)
-                latT, lonT = utm.to_latlon(
-                    self.SS_vehicle_target[0], self.SS_vehicle_target[1], self.SM_utm_zone_num, self.SM_utm_zone)
+                if (target_utm is None or
+                        target_utm[0] != self.SS_vehicle_target[0] or
+                        target_utm[1] != self.SS_vehicle_target[1]):
+                    target_utm = (self.SS_vehicle_target[0],
+                                  self.SS_vehicle_target[1])
+                    latT, lonT = utm.to_latlon(
+                        target_utm[0], target_utm[1], self.SM_utm_zone_num, self.SM_utm_zone)
                 if self.SS_vehicle_state == DroneSim.MISSION_STATE.SPIN:
                         hdg = self.SS_vehicle_hdg
                 else:
@@ -773,7 +782,7 @@ class DroneSim:
                     print("in Ping Measurement")
 
                     new_ping = rctPing(
-                        lat, lon, ping_measurement[0], ping_measurement[1], self.SS_vehicle_position[2], cur_time.timestamp())
+                        lat, lon, ping_measurement[0], ping_measurement[1], self.SS_vehicle_position[2], time.time())
 
                     #hdg = self.get_bearing(self.SS_vehicle_position[0], self.SS_vehicle_position[1], self.SS_vehicle_target[0], self.SS_vehicle_target[1])
 
@@ -789,7 +798,7 @@ class DroneSim:
             ###################
             # Position Output #
             ###################
-            if (cur_time - prev_pos_time).total_seconds() > self.SM_vehicle_position_msg_period:
+            if cur_time - prev_pos_time > self.SM_vehicle_position_msg_period:
                 self.transmit_position()
                 prev_pos_time = cur_time
             prev_time = cur_time
@@ -35,8 +35,9 @@
 
 import csv
 import datetime as dt
+import logging
 import math
-import time
+from typing import Union
 
 import numpy as np
 import utm
@@ -45,6 +46,8 @@ from RCTComms.comms import rctPingPacket
 from scipy.optimize import least_squares
 from scipy.stats import norm, zscore
 
+_log = logging.getLogger('rctGCS.ping')
+
 
 class rctCone:
     def __init__(self, lat: float, lon: float, amplitude: float, freq: int, alt: float, heading:float, time: float):
@@ -57,19 +60,25 @@ class rctCone:
         self.time = dt.datetime.fromtimestamp(time)
 
 class rctPing:
-    def __init__(self, lat: float, lon: float, power: float, freq: int, alt: float, time: float):
+    def __init__(self, lat: float, lon: float, power: float, freq: int, alt: float, time: Union[float, dt.datetime]):
         self.lat = lat
         self.lon = lon
         self.power = power
         self.freq = freq
         self.alt = alt
-        self.time = dt.datetime.fromtimestamp(time)
-        print("Time:", self.time)
+        if isinstance(time, dt.datetime):
+            self.time = time
+        else:
+            self.time = dt.datetime.fromtimestamp(time)
+        _log.debug('Ping time: %s', self.time)
 
 
-    def toNumpy(self):
+    def toNumpy(self, zone: int = None, let: str = None):
         # X, Y, Z, A
-        easting, northing, _, _ = utm.from_latlon(self.lat, self.lon)
+        # Pinning the zone keeps every ping of a session in the same
+        # projection and spares utm from re-deriving it for each ping
+        easting, northing, _, _ = utm.from_latlon(self.lat, self.lon,
+                force_zone_number=zone, force_zone_letter=let)
         return np.array([easting, northing, self.alt, self.power])
 
 
@@ -111,10 +120,9 @@ class rctPing:
         alt = packet.alt
         amp = packet.txp
         freq = packet.txf
-        t = packet.timestamp
-        tup = t.timetuple()
-        tim = time.mktime(tup)
-        return rctPing(lat, lon, amp, freq, alt, tim)
+        # The packet already carries a datetime, no need to round trip it
+        # through a POSIX timestamp
+        return rctPing(lat, lon, amp, freq, alt, packet.timestamp)
 
 
 
@@ -172,6 +180,7 @@ def mse(R, x, P, n, t, k):
 class DataManager:
     def __init__(self):
         self.__estimators = {}
+        self.__frequencies = ()
         self.zone = None
         self.let = None
         self.__vehiclePath = []
@@ -180,11 +189,13 @@ class DataManager:
         pingFreq = ping.freq
         if pingFreq not in self.__estimators:
             self.__estimators[pingFreq] = LocationEstimator()
-        self.__estimators[pingFreq].addPing(ping)
+            self.__frequencies = tuple(self.__estimators)
 
         if self.zone == None:
             self.setZone(ping.lat, ping.lon)
 
+        self.__estimators[pingFreq].addPing(ping, self.zone, self.let)
+
         return self.__estimators[pingFreq].doEstimate()
 
     def addVehicleLocation(self, coord):
@@ -201,9 +212,10 @@ class DataManager:
 
     def getFrequencies(self):
         '''
-        Returns a list of the transmitters detected so far
+        Returns a tuple of the transmitters detected so far.  The tuple is
+        only rebuilt when a new transmitter is detected.
         '''
-        return list(self.__estimators.keys())
+        return self.__frequencies
 
     def getPings(self, frequency: int):
         '''
@@ -229,13 +241,61 @@ class DataManager:
         estimator.doPrecision()
 
 
+def precisionKernel(pings: np.ndarray, x_tx: float, y_tx: float, P_tx: float,
+                    n: float, refX: float, minY: float, xSize: int,
+                    ySize: int):
+    '''
+    Numeric core of LocationEstimator.doPrecision.  Computes the
+    unnormalized likelihood of the transmitter being at each pixel of a 1 m
+    grid, given the n x 4 ping matrix and the estimated model parameters.
+    Takes and returns plain arrays only.
+    Args:
+        pings: n x 4 matrix of X_rx, Y_rx, Z_rx, P_rx
+        x_tx: Estimated transmitter easting
+        y_tx: Estimated transmitter northing
+        P_tx: Estimated transmitter power
+        n: Estimated path loss exponent
+        refX: Easting of the grid's first column
+        minY: Northing of the grid's first row
+        xSize: Number of grid columns
+        ySize: Number of grid rows
+    Returns:
+        Tuple of the [y, x] likelihood grid and the [y, x] easting and
+        northing grids
+    '''
+    P_rx = pings[:, 3]
+    modeledDistances = 10 ** ((P_tx - P_rx) / (10 * n))
+
+    distances = np.linalg.norm(pings[:, 0:3] - np.array([x_tx, y_tx, 0]),
+                               axis=1)
+    stdDistances = np.std(modeledDistances - distances)
+
+    # Evaluate p_d for every (pixel, ping) pair at once, the grid is [y, x]
+    # and the last axis runs over the pings
+    gridX, gridY = np.meshgrid(refX + np.arange(xSize),
+                               minY + np.arange(ySize))
+    dx = gridX[:, :, np.newaxis] - pings[:, 0]
+    dy = gridY[:, :, np.newaxis] - pings[:, 1]
+    gridDistances = np.sqrt(dx ** 2 + dy ** 2 + pings[:, 2] ** 2)
+    adjustedDistances = (gridDistances - modeledDistances) / stdDistances
+    probabilities = np.exp(-(adjustedDistances ** 2) / 2) / \
+        (math.sqrt(2 * math.pi) * stdDistances)
+
+    heatMapArea = np.prod(probabilities, axis=2) / (xSize * ySize)
+    return heatMapArea, gridX, gridY
+
+
 class LocationEstimator:
     def __init__(self):
         '''
         Creates a new LocationEstimator object.
         '''
 
-        self.__pings = []
+        # Pings are kept in a preallocated n x 4 matrix that doubles in
+        # size when full, rather than as a list of rows that has to be
+        # stacked again on every estimate
+        self.__pings = np.empty((64, 4), dtype=np.float64)
+        self.__numPings = 0
 
         self.__params = None
 
@@ -247,12 +307,18 @@ class LocationEstimator:
         self.last_l_tx1 = 0
         self.index = 0
 
-    def addPing(self, ping: rctPing):
-        self.__pings.append(ping.toNumpy())
+    def addPing(self, ping: rctPing, zone: int = None, let: str = None):
+        if self.__numPings == len(self.__pings):
+            grown = np.empty((max(2 * len(self.__pings), 64), 4),
+                             dtype=np.float64)
+            grown[:self.__numPings] = self.__pings
+            self.__pings = grown
+        self.__pings[self.__numPings] = ping.toNumpy(zone, let)
+        self.__numPings += 1
 
 
     def doEstimate(self):
-        if len(self.__pings) < 4:
+        if self.__numPings < 4:
             return None
 
         # have enough data to start
@@ -260,7 +326,7 @@ class LocationEstimator:
         if True:
             # Pings is now the data matrix of n x 4
             # Columns are X_rx, Y_rx, Z_rx, P_rx
-            pings = np.array(self.__pings)
+            pings = self.getPings()
             # first estimate, generate initial params from data
             # Location is average of current measurements
             # Power is max of measurements
@@ -273,7 +339,8 @@ class LocationEstimator:
             n_0 = 2
             self.__params = np.array([X_tx_0, Y_tx_0, P_tx_0, n_0])
             res_x = least_squares(self.__residuals, self.__params,
-            bounds=([0, 167000, -np.inf, 2], [833000, 10000000, np.inf, 2.1]))
+            bounds=([0, 167000, -np.inf, 2], [833000, 10000000, np.inf, 2.1]),
+            args=(pings,))
 
         if res_x.success:
             self.__params = res_x.x
@@ -303,15 +370,16 @@ class LocationEstimator:
         Prx = P_tx - 10 * n * np.log10(d)
         return Prx
 
-    def __residuals(self, paramVect):
-        result = np.zeros(len(self.__pings))
+    def __residuals(self, paramVect, pings):
+        # Vectorized dToPrx over the columns of the n x 4 ping matrix
+        l_tx = np.array([paramVect[0], paramVect[1], 0])
+        P_tx = paramVect[2]
+        n = paramVect[3]
 
-        for i in range(len(self.__pings)):
-            pingVector = self.__pings[i]
-            result[i] = pingVector[3] - \
-                self.dToPrx(pingVector, paramVect)
+        d = np.linalg.norm(pings[:, 0:3] - l_tx, axis=1)
+        d = np.maximum(d, 0.01)
 
-        return result
+        return pings[:, 3] - (P_tx - 10 * n * np.log10(d))
 
     def p_d(self, tx, dx, n, P_rx, P_tx, D_std):
             modeledDistance = self.RSSItoDistance(P_rx, P_tx, n)
@@ -329,9 +397,9 @@ class LocationEstimator:
         data_dir = 'holder'
         freq = 17350000
 
-        f_pings = self.__pings
+        f_pings = self.getPings()
 
-        print("%03.3f has %d pings" % (freq / 1e6, len(f_pings)))
+        _log.debug('%03.3f has %d pings', freq / 1e6, len(f_pings))
 
         zonenum = 11
 
@@ -345,20 +413,12 @@ class LocationEstimator:
         n = res_x[3]
 
 
-        pings = np.array(f_pings)
-
-        distances = np.linalg.norm(pings[:,0:3] - np.array([l_tx[0], l_tx[1], 0]), axis=1)
-        calculatedDistances = self.RSSItoDistance(pings[:,3], P, n)
-
-        distanceErrors = calculatedDistances - distances
-        stdDistances = np.std(distanceErrors)
-        P_rx = pings[:,3]
+        pings = f_pings
 
         size = 25
         tiffXSize = size
         tiffYSize = size
         pixelSize = 1
-        heatMapArea = np.ones((tiffYSize, tiffXSize)) / (tiffXSize * tiffYSize) # [y, x]
 
         self.last_l_tx0 = l_tx[0]
         self.last_l_tx1 = l_tx[1]
@@ -369,14 +429,14 @@ class LocationEstimator:
         self.refX = l_tx[0] - (size / 2)
         self.maxX = l_tx[0] + (size / 2)
 
-        csv_dict = []
-
-        for y in range(tiffYSize):
-            for x in range(tiffXSize):
-                for i in range(len(pings)):
-                    heatMapArea[y, x] *= self.p_d(np.array([x + self.refX, y + self.minY, 0]), pings[i,0:3], n, P_rx[i], P, stdDistances)
+        heatMapArea, gridX, gridY = precisionKernel(
+            pings, l_tx[0], l_tx[1], P, n, self.refX, self.minY,
+            tiffXSize, tiffYSize)
 
-                csv_dict.append({"easting": self.refX+x, "northing": self.minY+y, "value": (heatMapArea[y, x])})
+        csv_dict = [{"easting": easting, "northing": northing, "value": value}
+                    for easting, northing, value in zip(
+                        gridX.ravel().tolist(), gridY.ravel().tolist(),
+                        heatMapArea.ravel().tolist())]
 
         sumH = heatMapArea.sum()
         heatMapArea = heatMapArea / sumH
@@ -426,10 +486,11 @@ class LocationEstimator:
         pass
 
     def getPings(self):
-        return self.__pings
+        return self.__pings[:self.__numPings]
 
     def getNumPings(self):
-        return len(self.__pings)
+        return self.__numPings
 
     def setPings(self, pings):
-        self.__pings = pings
+        self.__pings = np.array(pings, dtype=np.float64).reshape(-1, 4)
+        self.__numPings = len(self.__pings)
@@ -44,11 +44,12 @@
 #
 ###############################################################################
 
+from collections import defaultdict
 from enum import Enum, auto
 import RCTComms.comms
 import logging
 import threading
-import RctGcs.ping
+from RctGcs import ping
 import copy
 
 
@@ -136,6 +137,14 @@ class RCT_STATES(Enum):
     fail = 6
 
 
+# Value to member tables for decoding heartbeats without going through the
+# Enum constructor on every packet
+_SDR_STATES_BY_VALUE = {state.value: state for state in SDR_INIT_STATES}
+_EXTS_STATES_BY_VALUE = {state.value: state for state in EXTS_STATES}
+_DIR_STATES_BY_VALUE = {state.value: state for state in OUTPUT_DIR_STATES}
+_RCT_STATES_BY_VALUE = {state.value: state for state in RCT_STATES}
+
+
 class Events(Enum):
     '''
     Callback Events
@@ -226,9 +235,10 @@ class MAVModel:
 
         self.EST_mgr = ping.DataManager()
 
-        self.__callbacks = {}
-        for event in Events:
-            self.__callbacks[event] = []
+        # Callbacks are registered and unregistered from worker threads while
+        # the receiver thread dispatches, so dispatch always iterates over a
+        # snapshot of the list
+        self.__callbacks = defaultdict(list)
         self.lastException = [None, None]
         self.__log.info("MAVModel Created")
 
@@ -277,7 +287,7 @@ class MAVModel:
         self.__log.info("Received frequencies")
         self.PP_options['TGT_frequencies'] = packet.frequencies
         self.__optionCacheDirty[self.TGT_PARAMS] = self.CACHE_GOOD
-        for callback in self.__callbacks[Events.GetFreqs]:
+        for callback in tuple(self.__callbacks[Events.GetFreqs]):
             callback()
 
     def __processOptions(self, packet: RCTComms.comms.rctOptionsPacket, addr: str):
@@ -297,7 +307,7 @@ class MAVModel:
         if packet.scope >= self.ENG_OPTIONS:
             self.__optionCacheDirty[self.ENG_OPTIONS] = self.CACHE_GOOD
 
-        for callback in self.__callbacks[Events.GetOptions]:
+        for callback in tuple(self.__callbacks[Events.GetOptions]):
             callback()
 
     def __processHeartbeat(self, packet: RCTComms.comms.rctHeartBeatPacket, addr: str):
@@ -308,13 +318,13 @@ class MAVModel:
             addr: Source of packet
         '''
         self.__log.info("Received heartbeat")
-        self.state['STS_sdr_status'] = SDR_INIT_STATES(packet.sdrState)
-        self.state['STS_dir_status'] = OUTPUT_DIR_STATES(
-            packet.storageState)
-        self.state['STS_gps_status'] = EXTS_STATES(packet.sensorState)
-        self.state['STS_sys_status'] = RCT_STATES(packet.systemState)
-        self.state['STS_sw_status'] = packet.switchState
-        for callback in self.__callbacks[Events.Heartbeat]:
+        state = self.state
+        state['STS_sdr_status'] = _SDR_STATES_BY_VALUE[packet.sdrState]
+        state['STS_dir_status'] = _DIR_STATES_BY_VALUE[packet.storageState]
+        state['STS_gps_status'] = _EXTS_STATES_BY_VALUE[packet.sensorState]
+        state['STS_sys_status'] = _RCT_STATES_BY_VALUE[packet.systemState]
+        state['STS_sw_status'] = packet.switchState
+        for callback in tuple(self.__callbacks[Events.Heartbeat]):
             callback()
 
     def __processNoHeartbeat(self, packet, addr):
@@ -324,7 +334,7 @@ class MAVModel:
             packet:    None
             addr:    None
         '''
-        for callback in self.__callbacks[Events.NoHeartbeat]:
+        for callback in tuple(self.__callbacks[Events.NoHeartbeat]):
             callback()
 
     def __processUpgradeStatus(self, packet: RCTComms.comms.rctUpgradeStatusPacket, addr: str):
@@ -336,7 +346,7 @@ class MAVModel:
         '''
         self.PP_options['UPG_state'] = packet.state
         self.PP_options['UPG_msg'] = packet.msg
-        for callback in self.__callback[Events.UpgradeStatus]:
+        for callback in tuple(self.__callbacks[Events.UpgradeStatus]):
             callback()
 
     def stop(self):
@@ -353,9 +363,24 @@ class MAVModel:
             event:    Event to trigger on
             callback:    Callback to call
         '''
-        assert(isinstance(event, Events))
+        if not isinstance(event, Events):
+            raise TypeError('event must be an Events member')
         self.__callbacks[event].append(callback)
 
+    def unregisterCallback(self, event: Events, callback):
+        '''
+        Removes a callback previously registered for the specified event
+        Args:
+            event:    Event the callback was registered for
+            callback:    Callback to remove
+        '''
+        if not isinstance(event, Events):
+            raise TypeError('event must be an Events member')
+        try:
+            self.__callbacks[event].remove(callback)
+        except ValueError:
+            pass
+
     def startMission(self, timeout:int):
         '''
         Sends the start mission command
@@ -397,11 +422,14 @@ class MAVModel:
             frequencyPacketEvent.clear()
             self.registerCallback(
                 Events.GetFreqs, frequencyPacketEvent.set)
-
-            self.__rx.sendPacket(RCTComms.comms.rctGETFCommand())
-            self.__log.info("Sent getF command")
-
-            frequencyPacketEvent.wait(timeout=timeout)
+            try:
+                self.__rx.sendPacket(RCTComms.comms.rctGETFCommand())
+                self.__log.info("Sent getF command")
+
+                frequencyPacketEvent.wait(timeout=timeout)
+            finally:
+                self.unregisterCallback(
+                    Events.GetFreqs, frequencyPacketEvent.set)
         return self.PP_options['TGT_frequencies']
 
     def __handleRemoteException(self, packet: RCTComms.comms.rctExceptionPacket, addr):
@@ -411,13 +439,13 @@ class MAVModel:
             packet: Traceback packet payload
             addr: Source of packet
         '''
-        self.__log.exception("Remote Exception: %s" % packet.exception)
-        self.__log.exception("Remote Traceback: %s" % packet.traceback)
+        self.__log.exception("Remote Exception: %s", packet.exception)
+        self.__log.exception("Remote Traceback: %s", packet.traceback)
         self.lastException[0] = packet.exception
         self.lastException[1] = packet.traceback
 #         This is a hack - there is no guarantee that the traceback occurs after
 #         the exception!
-        for callback in self.__callbacks[Events.Exception]:
+        for callback in tuple(self.__callbacks[Events.Exception]):
             callback()
 
     def setFrequencies(self, freqs: list, timeout):
@@ -427,9 +455,11 @@ class MAVModel:
             freqs: Frequencies to set as a list
             timeout: Timeout in seconds
         '''
-        assert(isinstance(freqs, list))
+        if not isinstance(freqs, list):
+            raise TypeError('freqs must be a list')
         for freq in freqs:
-            assert(isinstance(freq, int))
+            if not isinstance(freq, int):
+                raise TypeError('Frequencies must be integers')
 
         self.__optionCacheDirty[self.TGT_PARAMS] = self.CACHE_DIRTY
 
@@ -469,12 +499,14 @@ class MAVModel:
             frequency:    Frequency to remove
             timeout:    Timeout in seconds
         '''
-        if frequency not in self.PP_options['TGT_frequencies']:
+        frequencies = self.PP_options['TGT_frequencies']
+        try:
+            index = frequencies.index(frequency)
+        except ValueError:
             raise RuntimeError('Invalid frequency')
-        else:
-            newFreqs = copy.deepcopy(self.PP_options['TGT_frequencies'])
-            newFreqs.remove(frequency)
-            self.setFrequencies(newFreqs, timeout)
+        # Frequencies are ints, so slicing is as good as a deep copy
+        newFreqs = frequencies[:index] + frequencies[index + 1:]
+        self.setFrequencies(newFreqs, timeout)
 
     def getOptions(self, scope: int, timeout):
         '''
@@ -490,11 +522,13 @@ class MAVModel:
         optionPacketEvent.clear()
         self.registerCallback(
             Events.GetOptions, optionPacketEvent.set)
+        try:
+            self.__rx.sendPacket(RCTComms.comms.rctGETOPTCommand(scope))
+            self.__log.info("Sent GETOPT command")
 
-        self.__rx.sendPacket(RCTComms.comms.rctGETOPTCommand(scope))
-        self.__log.info("Sent GETOPT command")
-
-        optionPacketEvent.wait(timeout=timeout)
+            optionPacketEvent.wait(timeout=timeout)
+        finally:
+            self.unregisterCallback(Events.GetOptions, optionPacketEvent.set)
 
         acceptedKeywords = []
         if scope >= self.BASE_OPTIONS:
@@ -542,7 +576,6 @@ class MAVModel:
             else:
                 raise KeyError
 
-        print(scope)
         self.PP_options.update(kwargs)
         acceptedKeywords = []
         if scope >= self.BASE_OPTIONS:
@@ -559,7 +592,7 @@ class MAVModel:
         self.__ackVectors[0x05] = [event, 0]
         self.__rx.sendPacket(RCTComms.comms.rctSETOPTCommand(
             scope, **{key: self.PP_options[key] for key in acceptedKeywords}))
-        self.__log.info('Sent SETOPT command with scope %d' % scope)
+        self.__log.info('Sent SETOPT command with scope %d', scope)
         event.wait(timeout=timeout)
         if not self.__ackVectors.pop(0x05)[1]:
             raise RuntimeError("SETOPT NACKED")
@@ -584,10 +617,10 @@ class MAVModel:
         '''
         pingObj = ping.rctPing.fromPacket(packet)
         estimate = self.EST_mgr.addPing(pingObj)
-        for callback in self.__callbacks[Events.NewPing]:
+        for callback in tuple(self.__callbacks[Events.NewPing]):
             callback()
         if estimate is not None:
-            for callback in self.__callbacks[Events.NewEstimate]:
+            for callback in tuple(self.__callbacks[Events.NewEstimate]):
                 callback()
 
     def __processVehicle(self, packet: RCTComms.comms.rctVehiclePacket, addr: str):
@@ -599,13 +632,13 @@ class MAVModel:
         '''
         coordinate = [packet.lat, packet.lon, packet.alt, packet.hdg]
         self.state['VCL_track'][packet.timestamp] = coordinate
-        for callback in self.__callbacks[Events.VehicleInfo]:
+        for callback in tuple(self.__callbacks[Events.VehicleInfo]):
             callback()
 
     def __processCone(self, packet: RCTComms.comms.rctConePacket, addr: str):
         coordinate = [packet.lat, packet.lon, packet.alt, packet.power, packet.angle]
         self.state['CONE_track'][packet.timestamp] = coordinate
-        for callback in self.__callbacks[Events.ConeInfo]:
+        for callback in tuple(self.__callbacks[Events.ConeInfo]):
             callback()
 
     def __processAck(self, packet: RCTComms.comms.rctACKCommand, addr: str):
@@ -616,7 +649,9 @@ class MAVModel:
             addr:    Source address
         '''
         commandID = packet.commandID
-        if commandID in self.__ackVectors:
-            vector = self.__ackVectors[commandID]
+        # The waiting thread pops its vector when it times out, so look it up
+        # once rather than checking and then indexing
+        vector = self.__ackVectors.get(commandID)
+        if vector is not None:
             vector[1] = packet.ack
             vector[0].set()
@@ -69,6 +69,7 @@ import os.path
 import sys
 from pathlib import Path
 
+from PyQt5.QtNetwork import QNetworkDiskCache
 from PyQt5.QtWidgets import QFileDialog
 
 from RctGcs.config import (application_directories, get_config_path,
@@ -103,6 +104,27 @@ def configSetup() -> Path:
             return config.qgis_prefix_path
 
 
+def networkCacheSetup(max_size: int = 512 * 1024 * 1024) -> None:
+    '''
+    Helper function to point the QGIS network disk cache at the application
+    cache directory, so that web map tiles fetched once are reused by later
+    map loads and later sessions.  The cache is configured for this process
+    only, rather than through QgsSettings, which would also change the
+    user's desktop QGIS profile.  Must be called after QGIS is initialized.
+    Args:
+        max_size: Maximum size of the cache in bytes
+    '''
+    cache_dir = Path(application_directories.user_cache_dir, 'network')
+    cache_dir.mkdir(exist_ok=True, parents=True)
+    manager = QgsNetworkAccessManager.instance()
+    cache = manager.cache()
+    if not isinstance(cache, QNetworkDiskCache):
+        cache = QNetworkDiskCache(manager)
+        manager.setCache(cache)
+    cache.setCacheDirectory(cache_dir.as_posix())
+    cache.setMaximumCacheSize(max_size)
+
+
 def main():
     start_timestamp = dt.datetime.now()
     log_file = start_timestamp.strftime('%Y.%m.%d.%H.%M.%S_gcs.log')
@@ -126,6 +148,7 @@ def main():
     app = QgsApplication([], True)
 
     app.initQgis()
+    networkCacheSetup()
 
     ex = GCS()
     ex.show()
@@ -1,9 +1,43 @@
-import time
-from PyQt5.QtCore import Qt, pyqtSlot
+import logging
+from PyQt5.QtCore import (QRunnable, QSignalBlocker, Qt, QThreadPool,
+                          pyqtSignal, pyqtSlot)
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import QIntValidator
 from RctGcs.ui.popups import *
 
+def _as_num(text: str):
+    '''
+    Parses an option entry as an int, or as a float if it is not an integer
+    Args:
+        text: Text of the entry
+    '''
+    # Checking for digits first avoids raising ValueError for every integer
+    if text.strip().lstrip('+-').isdigit():
+        return int(text)
+    return float(text)
+
+class FunctionRunnable(QRunnable):
+    '''
+    QRunnable that calls a function on a QThreadPool worker thread.  Results
+    should be passed back to the GUI thread through signals.
+    '''
+    def __init__(self, fn, *args):
+        '''
+        Creates a new FunctionRunnable
+        Args:
+            fn: Function to call on the worker thread
+            args: Arguments to pass to fn
+        '''
+        super().__init__()
+        self.__fn = fn
+        self.__args = args
+
+    def run(self):
+        '''
+        Runs the function, called by the thread pool
+        '''
+        self.__fn(*self.__args)
+
 class CollapseFrame(QWidget):
     '''
     Custom Collapsible Widget - used to aid in
@@ -80,6 +114,21 @@ class SystemSettingsControl(CollapseFrame):
     This class provides for a custom widget that facilitates
     configuring system settings for the drone
     '''
+    # Options sent by submit_gui_option_vars for each scope, each scope
+    # includes the options of the scopes below it
+    _BASE_OPTION_KEYWORDS = ('SDR_center_freq', 'SDR_sampling_freq', 'SDR_gain')
+    _EXP_OPTION_KEYWORDS = _BASE_OPTION_KEYWORDS + (
+        'DSP_ping_width', 'DSP_ping_snr', 'DSP_ping_max', 'DSP_ping_min',
+        'SYS_output_dir')
+    _ENG_OPTION_KEYWORDS = _EXP_OPTION_KEYWORDS + (
+        'GPS_mode', 'GPS_baud', 'GPS_device', 'SYS_autostart')
+    _TEXT_OPTIONS = frozenset(('SYS_output_dir', 'GPS_device'))
+    _BOOL_OPTIONS = frozenset(('GPS_mode', 'SYS_autostart'))
+
+    # Results of the vehicle queries made on worker threads
+    options_fetched = pyqtSignal(object)
+    targets_fetched = pyqtSignal(object)
+
     def __init__(self, root):
         '''
         Creates a SystemSettingsControl Widget
@@ -88,83 +137,138 @@ class SystemSettingsControl(CollapseFrame):
         '''
         CollapseFrame.__init__(self, title='System Settings')
         self.__root = root
+        self.__log = logging.getLogger('rctGCS.SystemSettingsControl')
+        self.user_pops = UserPopups()
 
         self.__inner_frame = None
         self.frm_targ_holder = None
         self.scroll_targ_holder = None
         self.widg_targ_holder = None
-        self.targ_entries = {}
+        self.targ_entries = []
+        self.__targ_rows = []
+        self.__freq_range = None
+        self.__freq_validator = QIntValidator(self)
+        # Option values last fetched from or sent to the vehicle
+        self.__vehicle_options = {}
+        self.__expert_dialog = None
 
         self.option_vars = {
             "TGT_frequencies": [],
             "SDR_center_freq": None,
             "SDR_sampling_freq": None,
             "SDR_gain": None,
-            "SDR_ping_width": None,
-            "SDR_ping_snr": None,
-            "SDR_ping_max": None,
-            "SDR_ping_min": None,
+            "DSP_ping_width": None,
+            "DSP_ping_snr": None,
+            "DSP_ping_max": None,
+            "DSP_ping_min": None,
             "GPS_mode": None,
             "GPS_device": None,
             "GPS_baud": None,
             "SYS_output_dir": None,
             "SYS_autostart": None
         }
+        self.options_fetched.connect(self.__apply_options)
+        self.targets_fetched.connect(self.__update_widget)
         self.__create_widget()
 
     def update(self):
         '''
         Function to facilitate the updating of internal widget
-        displays
+        displays.  The targets are fetched from the vehicle on a worker
+        thread, and the widgets are updated once they arrive.
         '''
-        self.__update_widget() #add updated values
-
-        # Repaint widgets and layouts
-        self.widg_targ_holder.repaint()
-        self.scroll_targ_holder.repaint()
-        self.frm_targ_holder.activate()
-        #CollapseFrame.repaint(self) // causes thread problems?
-        self.__inner_frame.activate()
+        mav_model = self.__root._mav_model
+        if mav_model is None:
+            self.__update_widget(None)
+            return
+        QThreadPool.globalInstance().start(
+            FunctionRunnable(self.__fetch_targets, mav_model))
 
+    def __fetch_targets(self, mav_model):
+        '''
+        Worker thread half of update.  Gets the SDR frequencies and the
+        target frequencies from the vehicle and hands them to
+        __update_widget on the GUI thread.
+        Args:
+            mav_model: Model of the vehicle to query
+        '''
+        try:
+            cntr_freq = mav_model.getOption('SDR_center_freq')
+            samp_freq = mav_model.getOption('SDR_sampling_freq')
+            frequencies = list(mav_model.getFrequencies(self.__root.default_timeout))
+        except Exception:
+            self.__log.exception('Failed to get the target frequencies')
+            return
+        self.targets_fetched.emit((cntr_freq, samp_freq, frequencies))
 
-    def __update_widget(self):
+    def __update_widget(self, targets):
         '''
         Function to update displayed values of target widgets
+        Args:
+            targets: Tuple of the center frequency, sampling frequency and
+                     list of target frequencies, or None if there is no
+                     vehicle
         '''
-        if self.frm_targ_holder:
-            while (self.frm_targ_holder.count() > 0):
-                child = self.frm_targ_holder.takeAt(0)
-                if child.widget():
-                    child.widget().deleteLater()
-        row_idx = 0
-        self.targ_entries = {}
-        if self.__root._mav_model is not None:
-            cntr_freq = self.__root._mav_model.getOption('SDR_center_freq')
-            samp_freq = self.__root._mav_model.getOption('SDR_sampling_freq')
+        frequencies = []
+        if targets is not None:
+            cntr_freq, samp_freq, frequencies = targets
             self.option_vars["SDR_center_freq"].setText(str(cntr_freq))
             self.option_vars["SDR_sampling_freq"].setText(str(samp_freq))
             self.frm_targ_holder.setVerticalSpacing(0)
-            time.sleep(0.5)
-            for freq in self.__root._mav_model.getFrequencies(self.__root.default_timeout):
-                #Put in frm_targ_holder
-                new = QHBoxLayout()
-                freq_label = QLabel('Target %d' % (row_idx + 1))
-                freq_variable = freq
-                freq_entry = QLineEdit()
-                val = QIntValidator(cntr_freq-samp_freq, cntr_freq+samp_freq)
-                freq_entry.setValidator(val)
-                freq_entry.setText(str(freq_variable))
-
-                # Add new target to layout
-                new.addWidget(freq_label)
-                new.addWidget(freq_entry)
-                new_widg = QWidget()
-                new_widg.setLayout(new)
-                self.frm_targ_holder.addRow(new_widg)
-
-
-                self.targ_entries[freq] = [freq]
-                row_idx += 1
+
+            # Every row shares one validator, its range only changes with
+            # the SDR frequencies
+            if self.__freq_range != (cntr_freq, samp_freq):
+                self.__freq_range = (cntr_freq, samp_freq)
+                self.__freq_validator.setRange(cntr_freq-samp_freq,
+                                               cntr_freq+samp_freq)
+
+        # Hold off painting while the rows change so that the holder is
+        # laid out and painted once
+        self.widg_targ_holder.setUpdatesEnabled(False)
+        try:
+            # Rows are pooled: missing rows are created and surplus rows are
+            # hidden, so that a later refresh can show them again
+            for row_idx in range(len(self.__targ_rows), len(frequencies)):
+                self.__targ_rows.append(self.__create_target_row(row_idx))
+            for row_idx, (row_widget, _) in enumerate(self.__targ_rows):
+                row_widget.setVisible(row_idx < len(frequencies))
+
+            # The entries of the shown rows, in target order
+            self.targ_entries = [freq_entry for _, freq_entry
+                                 in self.__targ_rows[:len(frequencies)]]
+            for freq_entry, freq in zip(self.targ_entries, frequencies):
+                if freq_entry.validator() is not self.__freq_validator:
+                    freq_entry.setValidator(self.__freq_validator)
+                text = str(freq)
+                if freq_entry.text() != text:
+                    freq_entry.setText(text)
+        finally:
+            self.widg_targ_holder.setUpdatesEnabled(True)
+
+        # Qt schedules the repaint itself once the rows are laid out
+        self.frm_targ_holder.activate()
+        self.__inner_frame.activate()
+
+    def __create_target_row(self, row_idx: int):
+        '''
+        Creates a new target row at the end of frm_targ_holder
+        Args:
+            row_idx: Zero based index of the new row
+        Returns:
+            Tuple of the row widget and its frequency entry
+        '''
+        new = QHBoxLayout()
+        freq_label = QLabel('Target %d' % (row_idx + 1))
+        freq_entry = QLineEdit()
+
+        # Add new target to layout
+        new.addWidget(freq_label)
+        new.addWidget(freq_entry)
+        new_widg = QWidget()
+        new_widg.setLayout(new)
+        self.frm_targ_holder.addRow(new_widg)
+        return new_widg, freq_entry
 
     def __create_widget(self):
         '''
@@ -192,29 +296,6 @@ class SystemSettingsControl(CollapseFrame):
         self.scroll_targ_holder.setWidget(self.widg_targ_holder)
         self.widg_targ_holder.setLayout(self.frm_targ_holder)
 
-        row_idx = 0
-        self.targ_entries = {}
-        if self.__root._mav_model is not None:
-            for freq in self.__root._mav_model.getFrequencies(self.__root.default_timeout):
-                #Put in frm_targ_holder
-                new = QHBoxLayout()
-                freq_label = QLabel('Target %d' % (row_idx + 1))
-                freq_variable = freq
-                freq_entry = QLineEdit()
-                cntr_freq = self.__root._mav_model.getOption('SDR_center_freq')
-                samp_freq = self.__root._mav_model.getOption('SDR_sampling_freq')
-                val = QIntValidator(cntr_freq-samp_freq, cntr_freq+samp_freq)
-                freq_entry.setValidator(val)
-                freq_entry.setText(freq_variable)
-
-                new.addWidget(freq_label)
-                new.addWidget(freq_entry)
-                new_widg = QWidget()
-                new_widg.setLayout(new)
-                self.frm_targ_holder.addRow(new_widg)
-                self.targ_entries[freq] = [freq]
-                row_idx += 1
-
         # Add widgets to main layout: self.__inner_frame
         self.__inner_frame.addWidget(self.scroll_targ_holder, 4, 0, 1, 2)
         self.__inner_frame.addWidget(lbl_cntr_freq, 1, 0)
@@ -245,6 +326,9 @@ class SystemSettingsControl(CollapseFrame):
 
         self.set_content_layout(self.__inner_frame)
 
+        if self.__root._mav_model is not None:
+            self.update()
+
 
     def clear_targets(self):
         '''
@@ -259,18 +343,42 @@ class SystemSettingsControl(CollapseFrame):
         '''
         Helper function to open an ExpertSettingsDialog widget
         '''
-        openSettings = ExpertSettingsDialog(self, self.option_vars)
-        openSettings.exec_()
-
-    def validate_frequency(self, var: int):
+        # The dialog is built on first use and refreshed on later ones
+        if self.__expert_dialog is None:
+            self.__expert_dialog = ExpertSettingsDialog(self, self.option_vars)
+        else:
+            self.__expert_dialog.refresh()
+        self.__expert_dialog.exec_()
+
+    def __sdr_range(self):
+        '''
+        Returns the SDR center and sampling frequencies.  These are the
+        values fetched by the last refresh, the same ones the target
+        validator uses, and are only asked of the model before the first
+        refresh.
+        '''
+        if self.__freq_range is not None:
+            return self.__freq_range
+        mav_model = self.__root._mav_model
+        return (mav_model.getOption('SDR_center_freq'),
+                mav_model.getOption('SDR_sampling_freq'))
+
+    def validate_frequency(self, var: int, cntr_freq: int = None,
+                           samp_freq: int = None):
         '''
         Helper function to ensure frequencies are within an appropriate
         range
         Args:
             var: An integer value that is the frequency to be validated
+            cntr_freq: SDR center frequency, fetched from the model if None
+            samp_freq: SDR sampling frequency, fetched from the model if None
         '''
-        cntr_freq = self.__root._mav_model.getOption('SDR_center_freq')
-        samp_freq = self.__root._mav_model.getOption('SDR_sampling_freq')
+        if cntr_freq is None or samp_freq is None:
+            sdr_cntr_freq, sdr_samp_freq = self.__sdr_range()
+            if cntr_freq is None:
+                cntr_freq = sdr_cntr_freq
+            if samp_freq is None:
+                samp_freq = sdr_samp_freq
         if abs(var - cntr_freq) > samp_freq:
             return False
         return True
@@ -280,15 +388,20 @@ class SystemSettingsControl(CollapseFrame):
         Internal callback to be called when the update button is
         pressed
         '''
-        cntr_freq = int(self.option_vars['SDR_center_freq'].text())
-        samp_freq = int(self.option_vars['SDR_sampling_freq'].text())
+        # Fetched once for all of the targets
+        cntr_freq, samp_freq = self.__sdr_range()
 
         target_frequencies = []
-        for target_name in self.targ_entries:
-            if not self.validate_frequency(self.targ_entries[target_name][0]):
-                UserPopups.show_warning("Target frequency " + str(self.targ_entries[target_name][0]) + " is invalid. Please enter another value.")
+        for freq_entry in self.targ_entries:
+            # Use what is in the entry now, the user may have edited it
+            try:
+                target_freq = int(freq_entry.text())
+            except ValueError:
+                target_freq = None
+            if target_freq is None or \
+                    not self.validate_frequency(target_freq, cntr_freq, samp_freq):
+                self.user_pops.show_warning("Target frequency " + freq_entry.text() + " is invalid. Please enter another value.")
                 return
-            target_freq = self.targ_entries[target_name][0]
             target_frequencies.append(target_freq)
 
         self.__root._mav_model.setFrequencies(
@@ -299,62 +412,94 @@ class SystemSettingsControl(CollapseFrame):
         self.update_gui_option_vars()
 
     def update_gui_option_vars(self, scope=0, options=None):
+        '''
+        Requests the options of the given scope from the vehicle on a worker
+        thread.  The option widgets are updated once the options arrive.
+        Args:
+            scope: Scope of the options to request
+            options: Replacement option widget dictionary, if not None
+        '''
         if options is not None:
             self.option_vars = options
-        option_dict = self.__root._mav_model.getOptions(
-            scope, timeout=self.__root.default_timeout)
+        mav_model = self.__root._mav_model
+        if mav_model is None:
+            return
+        QThreadPool.globalInstance().start(
+            FunctionRunnable(self.__fetch_options, mav_model, scope))
+
+    def __fetch_options(self, mav_model, scope):
+        '''
+        Worker thread half of update_gui_option_vars
+        Args:
+            mav_model: Model of the vehicle to query
+            scope: Scope of the options to request
+        '''
+        try:
+            option_dict = mav_model.getOptions(
+                scope, timeout=self.__root.default_timeout)
+        except Exception:
+            self.__log.exception('Failed to get the options')
+            return
+        self.options_fetched.emit(option_dict)
+
+    def __apply_options(self, option_dict):
+        '''
+        Internal callback to show the options fetched by __fetch_options
+        Args:
+            option_dict: Dictionary of option names to values
+        '''
+        self.__vehicle_options.update(option_dict)
         for option_name, option_value in option_dict.items():
-            if option_name == 'GPS_mode' or option_name == 'SYS_autostart':
-                try:
-                    if option_value:
-                        self.option_vars[option_name].setText('true')
-                    else:
-                        self.option_vars[option_name].setText('false')
-                except AttributeError:
-                    UserPopups.show_warning("Failed to update GUI option vars", "Unexpected Error")
-                    print(option_name)
+            if option_name in self._BOOL_OPTIONS:
+                text = 'true' if option_value else 'false'
             else:
-                try:
-                    self.option_vars[option_name].setText(str(option_value))
-                except AttributeError:
-                    UserPopups.show_warning("Failed to update GUI option vars", "Unexpected Error")
-                    print(option_name)
+                text = str(option_value)
+            widget = self.option_vars.get(option_name)
+            if widget is None:
+                self.user_pops.show_warning("Failed to update GUI option vars", "Unexpected Error")
+                self.__log.warning('No widget for option %s', option_name)
+                continue
+            # Unchanged entries are left alone, and the refresh does not fire
+            # the entries' edit signals
+            if widget.text() != text:
+                with QSignalBlocker(widget):
+                    widget.setText(text)
         self.update()
 
     def submit_gui_option_vars(self, scope: int):
-        __base_option_keywords = ['SDR_center_freq',
-                                'SDR_sampling_freq', 'SDR_gain']
-        __exp_option_keywords = ['SDR_ping_width', 'SDR_ping_snr',
-                               'SDR_ping_max', 'SDR_ping_min', 'SYS_output_dir']
-        __eng_option_keywords = ['GPS_mode',
-                               'GPS_baud', 'GPS_device', 'SYS_autostart']
-
-        accepted_keywords = []
-        if scope >= 0x00:
-            accepted_keywords.extend(__base_option_keywords)
-        if scope >= 0x01:
-            accepted_keywords.extend(__exp_option_keywords)
+        '''
+        Sends the option values entered in the GUI to the vehicle
+        Args:
+            scope: Scope of the options to send
+        '''
         if scope >= 0xFF:
-            accepted_keywords.extend(__eng_option_keywords)
+            accepted_keywords = self._ENG_OPTION_KEYWORDS
+        elif scope >= 0x01:
+            accepted_keywords = self._EXP_OPTION_KEYWORDS
+        elif scope >= 0x00:
+            accepted_keywords = self._BASE_OPTION_KEYWORDS
+        else:
+            accepted_keywords = ()
 
         options = {}
 
         for keyword in accepted_keywords:
-            if keyword == 'SYS_output_dir' or keyword == 'GPS_device':
-                options[keyword] = self.option_vars[keyword].text()
-            elif keyword == 'GPS_mode' or keyword == 'SYS_autostart':
-                val = self.option_vars[keyword].text()
-                if val == 'true':
-                    options[keyword] = True
-                else:
-                    options[keyword] = False
+            text = self.option_vars[keyword].text()
+            if keyword in self._TEXT_OPTIONS:
+                options[keyword] = text
+            elif keyword in self._BOOL_OPTIONS:
+                options[keyword] = text == 'true'
             else:
-                try:
-                    options[keyword] = int(self.option_vars[keyword].text())
-                except ValueError:
-                    options[keyword] = float(self.option_vars[keyword].text())
+                options[keyword] = _as_num(text)
+
+        # Nothing to send if every entry still holds the vehicle's value
+        if all(keyword in self.__vehicle_options and
+               self.__vehicle_options[keyword] == value
+               for keyword, value in options.items()):
+            return
         self.__root._mav_model.setOptions(
             timeout=self.__root.default_timeout, **options)
+        self.__vehicle_options.update(options)
 
     def add_target(self):
         '''
@@ -365,19 +510,19 @@ class SystemSettingsControl(CollapseFrame):
             samp_freq = int(self.option_vars['SDR_sampling_freq'].text())
             sdr_gain = float(self.option_vars['SDR_gain'].text())
         except ValueError:
-            UserPopups.show_warning("Please enter center and sampling frequences and SDR gain settings.")
+            self.user_pops.show_warning("Please enter center and sampling frequences and SDR gain settings.")
             return
 
         if (cntr_freq < 70000000 or cntr_freq > 6000000000):
-            UserPopups.show_warning("Center frequency " + str(cntr_freq) + \
+            self.user_pops.show_warning("Center frequency " + str(cntr_freq) + \
                 " is invalid. Please enter another value.")
             return
         if (samp_freq < 0 or samp_freq > 56000000):
-            UserPopups.show_warning("Sampling frequency " + str(samp_freq) + \
+            self.user_pops.show_warning("Sampling frequency " + str(samp_freq) + \
                 " is invalid. Please enter another value.")
             return
         if (sdr_gain < 0 or sdr_gain > 70):
-            UserPopups.show_warning("SDR gain" + str(sdr_gain) + \
+            self.user_pops.show_warning("SDR gain" + str(sdr_gain) + \
                 " is invalid. Please enter another value.")
             return
 
@@ -389,7 +534,7 @@ class SystemSettingsControl(CollapseFrame):
         freq = add_target_window.freq
 
         if freq is None or not self.validate_frequency(freq):
-            #UserPopups.show_warning("Target frequency " + str(freq) +
+            #self.user_pops.show_warning("Target frequency " + str(freq) +
                 #" is invalid. Please enter another value.")
             return
 
@@ -416,4 +561,6 @@ class SystemSettingsControl(CollapseFrame):
         self.btn_clear_targs.setEnabled(False)
         self.btn_submit.setEnabled(False)
         self.btn_adv_settings.setEnabled(False)
+        self.__freq_range = None
+        self.__vehicle_options = {}
         self.__root._system_connection_tab.update_text("System: No Connection")
@@ -1,19 +1,82 @@
+import collections
 import configparser
+import datetime as dt
 import json
 import logging
-import queue as q
-from functools import partial
-
+import os
+import sys
+import threading
+from functools import lru_cache, partial
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+import numpy as np
 import utm
 from PyQt5.QtWidgets import (QFileDialog, QGridLayout, QLabel, QMainWindow,
                              QPushButton, QScrollArea, QVBoxLayout, QWidget)
 from RCTComms.transport import RCTTCPServer
 
-import RctGcs.rctCore
-from RctGcs.config import get_config_path, get_instance
+from RctGcs import rctCore
+from RctGcs.config import ConnectionMode, get_config_path, get_instance
 from RctGcs.ui.controls import *
 from RctGcs.ui.map import *
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    def _json_dumps(obj) -> bytes:
+        # export dicts may be keyed by ints, which json coerces to strings
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS |
+                            orjson.OPT_SERIALIZE_NUMPY)
+else:
+    def _json_default(obj):
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        raise TypeError('%s is not JSON serializable' % type(obj).__name__)
+
+    _json_encode = json.JSONEncoder(default=_json_default).encode
+
+    def _json_dumps(obj) -> bytes:
+        return _json_encode(obj).encode('utf-8')
+
+
+def _pings_to_latlon(pings, zone, let):
+    '''
+    Converts a batch of pings to lat/lon in one vectorized call
+    Args:
+        pings: Array of pings, one [easting, northing, alt, power] row per
+               ping
+        zone: UTM zone number of the pings
+        let: UTM zone letter of the pings
+    Returns:
+        Tuple of the latitude and longitude arrays
+    '''
+    # The pings were converted from lat/lon by ping.rctPing, so they are
+    # known to be in range and the bounds checks can be skipped
+    return utm.to_latlon(pings[:, 0], pings[:, 1], zone, let, strict=False)
+
+
+def _write_json_object(outfile, items):
+    '''
+    Writes a JSON object to outfile one member at a time, so that the
+    serialized form of the whole object never has to be held in memory.
+    Args:
+        outfile: Binary file to write to
+        items: Iterable of (key, value) pairs, which may be a generator
+    '''
+    outfile.write(b'{')
+    separator = b''
+    for key, value in items:
+        outfile.write(separator)
+        outfile.write(_json_dumps(key))
+        outfile.write(b':')
+        outfile.write(_json_dumps(value))
+        separator = b','
+    outfile.write(b'}')
+
 
 class GCS(QMainWindow):
     '''
@@ -23,13 +86,14 @@ class GCS(QMainWindow):
     sb_width = 500
     default_timeout = 5
     default_port_val = 9000
+    event_queue_size = 256
 
     sig = pyqtSignal()
 
     connect_signal = pyqtSignal(int)
     disconnect_signal = pyqtSignal(int)
-
-    mav_event_signal = pyqtSignal(RctGcs.rctCore.Events, int)
+    export_done = pyqtSignal(str)
+    export_failed = pyqtSignal(str)
 
     def __init__(self):
         '''
@@ -41,7 +105,10 @@ class GCS(QMainWindow):
         self._transport = None
         self._mav_models = {}
         self._mav_model = None
-        self._buttons = []
+        self.__ping_cursors = {}
+        self.__ping_tasks = {}
+        self.__ping_task_count = 0
+        self.__mission_controls = None
         self._system_connection_tab = None
         self.system_settings_widget = None
         self.__mission_status_text = "Start Recording"
@@ -57,50 +124,73 @@ class GCS(QMainWindow):
         self.user_popups = UserPopups()
         self.config = get_instance(get_config_path())
 
+        self.__mav_event_handlers = {
+            rctCore.Events.Heartbeat: self.__heartbeat_callback,
+            rctCore.Events.Exception: self.__handle_remote_exception,
+            rctCore.Events.VehicleInfo: self.__handle_vehicle_info,
+            rctCore.Events.NewPing: self.__handle_new_ping,
+            rctCore.Events.NewEstimate: self.__handle_new_estimate,
+            rctCore.Events.ConeInfo: self.__handle_new_cone,
+        }
+
         self.__create_widgets()
-        for button in self._buttons:
-            button.config(state='disabled')
 
-        self.queue = q.Queue()
+        self.queue = collections.deque(maxlen=self.event_queue_size)
+        self.__queue_lock = threading.Lock()
         self.sig.connect(self.execute_inmain, Qt.QueuedConnection)
 
         self.connect_signal.connect(self.connection_slot)
         self.disconnect_signal.connect(self.disconnect_slot)
+        self.export_done.connect(self.__export_done, Qt.QueuedConnection)
+        self.export_failed.connect(self.__export_failed, Qt.QueuedConnection)
 
     def execute_inmain(self):
-        while not self.queue.empty():
-            (fn, coord, frequency, num_pings) = self.queue.get()
-            fn(coord, frequency, num_pings)
-
-    def __mav_event_handler(self, event, id):
-        if event == rctCore.Events.Heartbeat:
-            self.__heartbeat_callback(id)
-        if event == rctCore.Events.Exception:
-            self.__handle_remote_exception(id)
-        if event == rctCore.Events.VehicleInfo:
-            self.__handle_vehicle_info(id)
-        if event == rctCore.Events.NewPing:
-            self.__handle_new_ping(id)
-        if event == rctCore.Events.NewEstimate:
-            self.__handle_new_estimate(id)
-        if event == rctCore.Events.ConeInfo:
-            self.__handle_new_cone(id)
+        '''
+        Runs the calls queued by post_to_main on the GUI thread
+        '''
+        # Swap in an empty queue so producers are only blocked for the swap
+        with self.__queue_lock:
+            pending = self.queue
+            self.queue = collections.deque(maxlen=self.event_queue_size)
+        # A failing handler must not drop the rest of the batch
+        for fn, args in pending:
+            try:
+                fn(*args)
+            except Exception:
+                self.__log.exception('GUI event handler %r failed', fn)
+
+    def post_to_main(self, fn, *args):
+        '''
+        Queues fn(*args) to be run on the GUI thread.  This is safe to call
+        from the comms threads and never blocks on the GUI - if the GUI has
+        fallen behind, the oldest queued call is dropped.
+        Args:
+            fn: Callable to run on the GUI thread
+            args: Arguments to pass to fn
+        '''
+        with self.__queue_lock:
+            if len(self.queue) == self.queue.maxlen:
+                self.__log.warning('GUI event queue full, dropping oldest event')
+            self.queue.append((fn, args))
+            # Only the call that makes the queue non-empty needs to wake the
+            # GUI, later calls are picked up by the same drain
+            need_wake = len(self.queue) == 1
+        if need_wake:
+            self.sig.emit()
 
     def __register_model_callbacks(self, id):
         mav_model = self._mav_models[id]
-        event_types = [rctCore.Events.Heartbeat, rctCore.Events.Exception,
-                    rctCore.Events.VehicleInfo, rctCore.Events.NewPing,
-                    rctCore.Events.NewEstimate, rctCore.Events.ConeInfo]
-        for event_type in event_types:
+        # Each event is bound straight to its handler so that nothing needs to
+        # be looked up per event when the queued call runs
+        for event_type, handler in self.__mav_event_handlers.items():
             mav_model.registerCallback(event_type,
-            partial(self.mav_event_signal.emit, event_type, id))
+            partial(self.post_to_main, handler, id))
 
     def __start_transport(self):
 
         if self._transport is not None and self._transport.isOpen():
             self._transport.close()
-        self.mav_event_signal.connect(self.__mav_event_handler)
-        if self.config.connection_mode == RctGcs.config.ConnectionMode.TOWER:
+        if self.config.connection_mode == ConnectionMode.TOWER:
             self._transport = RCTTCPServer(self.port_val, self.connection_handler)
             self._transport.open()
         else:
@@ -137,11 +227,8 @@ class GCS(QMainWindow):
         '''
         self.update_connections_label()
         self.system_settings_widget.connection_made()
-        self.__mission_status_btn.setEnabled(True)
-        self.__btn_export_all.setEnabled(True)
-        self.__btn_precision.setEnabled(True)
-        self.__btn_heat_map.setEnabled(True)
-        self.__log.info('Connected {}'.format(id))
+        self.__mission_controls.setEnabled(True)
+        self.__log.info('Connected %d', id)
 
     def __disconnect_handler(self, id):
         mav_model = self._mav_models[id]
@@ -156,14 +243,12 @@ class GCS(QMainWindow):
         Handle GUI updates in main thread by connecting pyqt signal to the
         remaining disconnection work
         '''
+        self.__ping_cursors.pop(id, None)
         if len(self._mav_models) == 0:
             self.system_settings_widget.disconnected()
-            self.__mission_status_btn.setEnabled(False)
-            self.__btn_export_all.setEnabled(False)
-            self.__btn_precision.setEnabled(False)
-            self.__btn_heat_map.setEnabled(False)
+            self.__mission_controls.setEnabled(False)
         self.update_connections_label()
-        self.__log.info('Disconnected {}'.format(id))
+        self.__log.info('Disconnected %d', id)
 
     def update_connections_label(self):
         num_connections = len(self._mav_models)
@@ -190,7 +275,7 @@ class GCS(QMainWindow):
         try:
             self.__change_model(list(self._mav_models.keys())[index])
         except:
-            print('Failed to change Model to {}'.format(index))
+            self.__log.exception('Failed to change Model to %d', index)
             self.__use_default_model()
 
     def __use_default_model(self):
@@ -230,49 +315,115 @@ class GCS(QMainWindow):
         '''
         Internal callback for the no heartbeat state
         '''
-        for button in self._buttons:
-            button.config(state='disabled')
+        self.__mission_controls.setEnabled(False)
         self.user_popups.show_warning("No Heartbeats Received")
 
     def __handle_new_estimate(self, id):
         '''
         Internal callback to handle when a new estimate is received
         '''
+        map_display = self.map_display
+        map_options = self.map_options
+        if map_display is None and map_options is None:
+            return
+
         mav_model = self._mav_models[id]
-        freq_list = mav_model.EST_mgr.getFrequencies()
-        for frequency in freq_list:
-            params, stale, res = mav_model.EST_mgr.getEstimate(frequency)
+        est_mgr = mav_model.EST_mgr
+        frequencies = []
+        estimates = []
+        for frequency in est_mgr.getFrequencies():
+            estimate = est_mgr.getEstimate(frequency)
+            if estimate is not None:
+                frequencies.append(frequency)
+                estimates.append(estimate)
+        if len(estimates) == 0:
+            return
 
-            zone, let = mav_model.EST_mgr.getUTMZone()
-            coord = utm.to_latlon(params[0], params[1], zone, let)
+        # Convert every estimate in one vectorized call
+        params = np.array([estimate[0][0:2] for estimate in estimates])
+        zone, let = est_mgr.getUTMZone()
+        lats, lons = utm.to_latlon(params[:, 0], params[:, 1], zone, let)
 
-            num_pings = mav_model.EST_mgr.getnum_pings(frequency)
+        for frequency, (_, stale, res), lat, lon in zip(
+                frequencies, estimates, lats.tolist(), lons.tolist()):
+            coord = (lat, lon)
 
-            if self.map_display is not None:
-                self.map_display.plot_estimate(coord, frequency)
-                #self.queue.put( (self.map_display.plot_precision, coord, frequency, num_pings) )
-                #self.sig.emit()
-                #self.map_display.plot_precision(coord, frequency, num_pings)
+            if map_display is not None:
+                map_display.plot_estimate(coord, frequency)
+                #self.post_to_main(self.map_display.plot_precision, coord, frequency, est_mgr.getNumPings(frequency))
+                #self.map_display.plot_precision(coord, frequency, est_mgr.getNumPings(frequency))
 
-            if self.map_options is not None:
-                self.map_options.est_distance(coord, stale, res)
+            if map_options is not None:
+                map_options.est_distance(coord, stale, res)
 
 
     def __handle_new_ping(self, id):
         '''
         Internal callback to handle when a new ping is received
         '''
+        # Pings are only converted for plotting.  The cursors are left where
+        # they are, so the backlog is plotted once a map is loaded
+        if self.map_display is None:
+            return
+
         mav_model = self._mav_models[id]
-        freq_list = mav_model.EST_mgr.getFrequencies()
-        for frequency in freq_list:
-            last = mav_model.EST_mgr.getPings(frequency)[-1].tolist()
-            zone, let = mav_model.EST_mgr.getUTMZone()
-            u = (last[0], last[1], zone, let)
-            coord = utm.to_latlon(*u)
-            power = last[3]
+        est_mgr = mav_model.EST_mgr
+
+        # Gather every ping received since the last call, across all
+        # frequencies, so that they are converted in a single call
+        cursors = self.__ping_cursors.setdefault(id, {})
+        new_pings = []
+        for frequency in est_mgr.getFrequencies():
+            pings = est_mgr.getPings(frequency)
+            new_pings.extend(pings[cursors.get(frequency, 0):])
+            cursors[frequency] = len(pings)
+        if len(new_pings) == 0:
+            return
+
+        pings = np.asarray(new_pings)
+        zone, let = est_mgr.getUTMZone()
+
+        # The conversion runs on the QGIS task pool, only the feature insert
+        # happens back on the GUI thread
+        self.__ping_task_count += 1
+        key = self.__ping_task_count
+        task = QgsTask.fromFunction('Convert pings', self.__convert_pings,
+                                    pings, zone, let,
+                                    on_finished=partial(self.__pings_converted, key))
+        self.__ping_tasks[key] = task
+        QgsApplication.taskManager().addTask(task)
 
-            if self.map_display is not None:
-                self.map_display.plot_ping(coord, power)
+    @staticmethod
+    def __convert_pings(task, pings, zone, let):
+        '''
+        QgsTask function to convert a batch of pings to lat/lon
+        Args:
+            task: The running QgsTask
+            pings: Array of pings, one [easting, northing, alt, power] row
+                   per ping
+            zone: UTM zone number of the pings
+            let: UTM zone letter of the pings
+        Returns:
+            Tuple of the list of (lat, lon) pairs and the list of powers
+        '''
+        lats, lons = _pings_to_latlon(pings, zone, let)
+        return list(zip(lats.tolist(), lons.tolist())), pings[:, 3].tolist()
+
+    def __pings_converted(self, key, exception, result=None):
+        '''
+        Internal callback for when a ping conversion task has finished
+        Args:
+            key: Key of the task in self.__ping_tasks
+            exception: Exception raised by the task, if any
+            result: Return value of __convert_pings
+        '''
+        self.__ping_tasks.pop(key, None)
+        if exception is not None:
+            self.__log.error('Failed to convert pings: %s', exception)
+            return
+        if result is not None and self.map_display is not None:
+            coords, powers = result
+            self.map_display.plot_pings(coords, powers)
 
     def __handle_vehicle_info(self, id):
         '''
@@ -281,8 +432,10 @@ class GCS(QMainWindow):
         mav_model = self._mav_models[id]
         if mav_model == None:
             return
-        last = list(mav_model.state['VCL_track'])[-1]
-        coord = mav_model.state['VCL_track'][last]
+        # The track is keyed by time in arrival order, so the newest entry is
+        # the last key
+        vehicle_track = mav_model.state['VCL_track']
+        coord = vehicle_track[next(reversed(vehicle_track))]
 
         mav_model.EST_mgr.addVehicleLocation(coord)
 
@@ -293,15 +446,18 @@ class GCS(QMainWindow):
         '''
         Internal callback to handle new cone info
         '''
+        map_display = self.map_display
+        if map_display is None:
+            return
+
         mav_model = self._mav_models[id]
         if mav_model == None:
             return
 
-        recent_cone = list(mav_model.state['CONE_track'])[-1]
-        cone = mav_model.state['CONE_track'][recent_cone]
+        cone_track = mav_model.state['CONE_track']
+        cone = cone_track[next(reversed(cone_track))]
 
-        if self.map_display is not None:
-            self.map_display.plot_cone(cone)
+        map_display.plot_cone(cone)
 
     def __handle_remote_exception(self, id):
         '''
@@ -323,121 +479,24 @@ class GCS(QMainWindow):
             self.__mission_status_btn.setText('Start Recording')
             self._mav_model.stopMission(timeout=self.default_timeout)
 
-    def __update_status(self): # TODO: this isn't getting used and doesn't seem to work???
-        '''
-        Internal callback for status variable update
-        '''
-        for button in self._buttons:
-            button.config(state='normal')
-        self.progress_bar['value'] = 0
-        sdr_status = self._mav_model.STS_sdr_status
-        dir_status = self._mav_model.STS_dir_status
-        gps_status = self._mav_model.STS_gps_status
-        sys_status = self._mav_model.STS_sys_status
-        sw_status = self._mav_model.STS_sw_status
-
-        sdr_map = {
-            self._mav_model.SDR_INIT_STATES.find_devices: ('SDR: Searching for devices', 'yellow'),
-            self._mav_model.SDR_INIT_STATES.wait_recycle: ('SDR: Recycling!', 'yellow'),
-            self._mav_model.SDR_INIT_STATES.usrp_probe: ('SDR: Initializing SDR', 'yellow'),
-            self._mav_model.SDR_INIT_STATES.rdy: ('SDR: Ready', 'green'),
-            self._mav_model.SDR_INIT_STATES.fail: ('SDR: Failed!', 'red')
-        }
-
-        try:
-            self.sdr_status_label.config(
-                text=sdr_map[sdr_status][0], bg=sdr_map[sdr_status][1])
-        except KeyError:
-            self.sdr_status_label.config(
-                text='SDR: NULL', bg='red')
-
-        dir_map = {
-            self._mav_model.OUTPUT_DIR_STATES.get_output_dir: ('DIR: Searching', 'yellow'),
-            self._mav_model.OUTPUT_DIR_STATES.check_output_dir: ('DIR: Checking for mount', 'yellow'),
-            self._mav_model.OUTPUT_DIR_STATES.check_space: ('DIR: Checking for space', 'yellow'),
-            self._mav_model.OUTPUT_DIR_STATES.wait_recycle: ('DIR: Recycling!', 'yellow'),
-            self._mav_model.OUTPUT_DIR_STATES.rdy: ('DIR: Ready', 'green'),
-            self._mav_model.OUTPUT_DIR_STATES.fail: ('DIR: Failed!', 'red'),
-        }
-
-        try:
-            self.dir_status_label.config(
-                text=dir_map[dir_status][0], bg=dir_map[dir_status][1])
-        except KeyError:
-            self.dir_status_label.config(text='DIR: NULL', bg='red')
-
-        gps_map = {
-            self._mav_model.GPS_STATES.get_tty: {'text': 'GPS: Getting TTY Device', 'bg': 'yellow'},
-            self._mav_model.GPS_STATES.get_msg: {'text': 'GPS: Waiting for message', 'bg': 'yellow'},
-            self._mav_model.GPS_STATES.wait_recycle: {'text': 'GPS: Recycling', 'bg': 'yellow'},
-            self._mav_model.GPS_STATES.rdy: {'text': 'GPS: Ready', 'bg': 'green'},
-            self._mav_model.GPS_STATES.fail: {
-                'text': 'GPS: Failed!', 'bg': 'red'}
-        }
-
-        try:
-            self.gps_status_label.config(**gps_map[gps_status])
-        except KeyError:
-            self.gps_status_label.config(text='GPS: NULL', bg='red')
-
-        sys_map = {
-            self._mav_model.RCT_STATES.init: {'text': 'SYS: Initializing', 'bg': 'yellow'},
-            self._mav_model.RCT_STATES.wait_init: {'text': 'SYS: Initializing', 'bg': 'yellow'},
-            self._mav_model.RCT_STATES.wait_start: {'text': 'SYS: Ready for start', 'bg': 'green'},
-            self._mav_model.RCT_STATES.start: {'text': 'SYS: Starting', 'bg': 'blue'},
-            self._mav_model.RCT_STATES.wait_end: {'text': 'SYS: Running', 'bg': 'blue'},
-            self._mav_model.RCT_STATES.finish: {'text': 'SYS: Stopping', 'bg': 'blue'},
-            self._mav_model.RCT_STATES.fail: {'text': 'SYS: Failed!', 'bg': 'red'},
-        }
-
-        try:
-            self.sys_status_label.config(**sys_map[sys_status])
-        except KeyError:
-            self.sys_status_label.config(text='SYS: NULL', bg='red')
-
-        if sw_status == 0:
-            self.sw_status_label.config(text='SW: OFF', bg='yellow')
-        elif sw_status == 1:
-            self.sw_status_label.config(text='SW: ON', bg='green')
-        else:
-            self.sw_status_label.config(text='SW: NULL', bg='red')
-
     def export_all(self):
         '''
-        Exports pings, vehcle path, and settings as json file
-        '''
-        final = {}
-
-        if self.map_display is not None:
-            vehicle_path = self._mav_model.EST_mgr.getVehiclePath()
-            ping_dict = {}
-            vehicle_dict = {}
-            ind_ping = 0
-            ind_path = 0
-            freq_list = self._mav_model.EST_mgr.getFrequencies()
-            for frequency in freq_list:
-                pings = self._mav_model.EST_mgr.getPings(frequency)
-                for ping_array in pings:
-                    ping_list = ping_array.tolist()
-                    zone, let = self._mav_model.EST_mgr.getUTMZone()
-                    u = (ping_list[0], ping_list[1], zone, let)
-                    coord = utm.to_latlon(*u)
-                    amp = ping_list[3]
-                    new_ping = {}
-                    new_ping['Frequency'] = frequency
-                    new_ping['Coordinate'] = coord
-                    new_ping['Amplitude'] = amp
-                    ping_dict[ind_ping] = new_ping
-                    ind_ping = ind_ping + 1
-            for coord in vehicle_path:
-                new_coord = {}
-                new_coord['Coordinate'] = (coord[0], coord[1])
-                vehicle_dict[ind_path] = new_coord
-                ind_path = ind_path + 1
-
-            final['Pings'] = ping_dict
-            final['Vehicle Path'] = vehicle_dict
-
+        Exports pings, vehcle path, and settings as json file.  The data is
+        copied on the GUI thread, then converted and written on a worker
+        thread so that large sessions do not freeze the window.
+        '''
+        pings = None
+        vehicle_path = None
+        zone = let = None
+        if self.map_display is not None and self._mav_model is not None:
+            # Copy the data owned by the comms thread before handing it off
+            est_mgr = self._mav_model.EST_mgr
+            pings = {frequency: np.array(est_mgr.getPings(frequency))
+                     for frequency in est_mgr.getFrequencies()}
+            vehicle_path = list(est_mgr.getVehiclePath())
+            zone, let = est_mgr.getUTMZone()
+
+        option_dict = None
         if self.system_settings_widget is not None:
             option_vars = self.system_settings_widget.option_vars
             option_dict = {}
@@ -447,8 +506,7 @@ class GCS(QMainWindow):
                 elif option_vars[key] is not None:
                     option_dict[key] = option_vars[key].text()
 
-            final['System Settings'] = option_dict
-
+        new_var_dict = None
         if self._mav_model is not None:
             var_dict = self._mav_model.state
             new_var_dict = {}
@@ -462,27 +520,124 @@ class GCS(QMainWindow):
                     new_var_dict[key] = temp
                 elif(key == 'VCL_track'):
                     pass
+                elif isinstance(var_dict[key], dict):
+                    # tracks such as CONE_track are keyed by timestamp,
+                    # which json cannot encode as a key
+                    new_var_dict[key] = {
+                        (k.isoformat() if isinstance(k, dt.datetime) else k): v
+                        for k, v in var_dict[key].items()}
                 else:
                     new_var_dict[key] = var_dict[key]
 
+        # Only one export may write at a time, the button is enabled again
+        # once the worker reports back
+        self.__btn_export_all.setEnabled(False)
+        QThreadPool.globalInstance().start(FunctionRunnable(
+            self.__write_export, 'data.json', pings, vehicle_path, zone, let,
+            option_dict, new_var_dict))
 
-            final['States'] = new_var_dict
-
-        with open('data.json', 'w') as outfile:
-            json.dump(final, outfile)
-
+    def __write_export(self, path, pings, vehicle_path, zone, let,
+                       option_dict, new_var_dict):
+        '''
+        Worker thread half of export_all.  Converts the ping snapshot to
+        lat/lon and writes the export file, then signals the GUI thread.
+        Args:
+            path: Path of the file to write
+            pings: Dict of frequency to ping array, or None to skip pings
+                   and the vehicle path
+            vehicle_path: Copy of the vehicle path
+            zone: UTM zone number of the pings
+            let: UTM zone letter of the pings
+            option_dict: System settings to export, or None
+            new_var_dict: Vehicle states to export, or None
+        '''
+        # Write next to the export file and rename over it, so that a failed
+        # export never leaves a truncated file behind
+        export_path = Path(path).absolute()
+        tmp_name = None
+        try:
+            with NamedTemporaryFile('wb', dir=export_path.parent,
+                                    prefix=export_path.name, suffix='.tmp',
+                                    delete=False) as outfile:
+                tmp_name = outfile.name
+                _write_json_object(outfile, self.__export_sections(
+                    pings, vehicle_path, zone, let, option_dict, new_var_dict))
+            os.replace(tmp_name, export_path)
+        except Exception as e:
+            self.__log.exception('Export to %s failed', path)
+            if tmp_name is not None and os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            self.export_failed.emit(str(e))
+            return
+        self.export_done.emit(path)
+
+    @staticmethod
+    def __export_sections(pings, vehicle_path, zone, let, option_dict,
+                          new_var_dict):
+        '''
+        Generates the top level (key, value) pairs of the export file.  Each
+        section is only built once the previous one has been written.
+        Args: see __write_export
+        '''
+        if pings is not None:
+            # Pings are written column-wise, one array per field
+            freq_pings = [freq_ping for freq_ping in pings.values()
+                          if len(freq_ping) > 0]
+            if freq_pings:
+                all_pings = np.concatenate(freq_pings)
+                lats, lons = _pings_to_latlon(all_pings, zone, let)
+                frequencies = np.repeat(
+                    np.array([frequency for frequency, freq_ping in pings.items()
+                              if len(freq_ping) > 0], dtype=np.int64),
+                    [len(freq_ping) for freq_ping in freq_pings])
+                amplitudes = np.ascontiguousarray(all_pings[:, 3])
+            else:
+                frequencies = lats = lons = amplitudes = np.empty(0)
+            yield 'Pings', {
+                'Frequency': frequencies,
+                'Latitude': np.ascontiguousarray(lats),
+                'Longitude': np.ascontiguousarray(lons),
+                'Amplitude': amplitudes
+            }
+            # Written as a compact [[lat, lon], ...] array
+            if len(vehicle_path) > 0:
+                yield 'Vehicle Path', np.ascontiguousarray(
+                    np.asarray(vehicle_path, dtype=float)[:, :2])
+            else:
+                yield 'Vehicle Path', []
+
+        if option_dict is not None:
+            yield 'System Settings', option_dict
+
+        if new_var_dict is not None:
+            yield 'States', new_var_dict
+
+    def __export_done(self, path):
+        '''
+        Internal callback for when the export worker has written its file
+        Args:
+            path: Path of the written file
+        '''
+        self.__log.info('Exported session to %s', path)
+        self.__btn_export_all.setEnabled(True)
 
+    def __export_failed(self, message):
+        '''
+        Internal callback for when the export worker failed
+        Args:
+            message: Description of the error
+        '''
+        self.__btn_export_all.setEnabled(True)
+        self.user_popups.show_warning('Export failed!\n%s' % message)
 
     def closeEvent(self, event):
         '''
         Internal callback for window close
         '''
-        trans = QgsCoordinateTransform(
-            QgsCoordinateReferenceSystem("EPSG:3857"),
-            QgsCoordinateReferenceSystem("EPSG:4326"),
-            QgsProject.instance())
         if self.map_display is not None:
-            ext = trans.transformBoundingBox(self.map_display.canvas.extent())
+            # The map widget already holds a 3857 -> 4326 transform
+            ext = self.map_display.transform.transformBoundingBox(
+                self.map_display.canvas.extent())
             lat1 = ext.yMaximum()
             lon1 = ext.xMinimum()
             lat2 = ext.yMinimum()
@@ -495,6 +650,9 @@ class GCS(QMainWindow):
                     (lat2, lon2)
                 )
 
+        if self.map_options is not None:
+            self.map_options.close_results()
+
         for id in self._mav_models:
             mav_model = self._mav_models[id]
             mav_model.stop()
@@ -605,33 +763,39 @@ class GCS(QMainWindow):
 
         self._config_tab.set_content_layout(lay_config)
 
+        # MISSION CONTROLS
+        # The buttons share one container so that they are enabled and
+        # disabled together with a single call
+        self.__mission_controls = QWidget()
+        lay_mission = QVBoxLayout(self.__mission_controls)
+        lay_mission.setContentsMargins(0, 0, 0, 0)
+
         # START PAYLOAD RECORDING
         self.__mission_status_btn = QPushButton(self.__mission_status_text)
-        self.__mission_status_btn.setEnabled(False)
         self.__mission_status_btn.clicked.connect(self.__start_stop_mission)
 
         self.__btn_export_all = QPushButton('Export Info')
-        self.__btn_export_all.setEnabled(False)
         self.__btn_export_all.clicked.connect(self.export_all)
 
         self.__btn_precision = QPushButton('Do Precision')
-        self.__btn_precision.setEnabled(False)
         self.__btn_precision.clicked.connect(self.__do_precision)
 
         self.__btn_heat_map = QPushButton('Display Heatmap')
-        self.__btn_heat_map.setEnabled(False)
         self.__btn_heat_map.clicked.connect(self.__do_display_heatmap)
 
+        lay_mission.addWidget(self.__mission_status_btn)
+        lay_mission.addWidget(self.__btn_export_all)
+        lay_mission.addWidget(self.__btn_precision)
+        lay_mission.addWidget(self.__btn_heat_map)
+        self.__mission_controls.setEnabled(False)
+
         wlay.addWidget(self._system_connection_tab)
         wlay.addWidget(self.status_widget)
         wlay.addWidget(self.map_control)
         wlay.addWidget(self.system_settings_widget)
         wlay.addWidget(self.upgrade_display)
         wlay.addWidget(self._config_tab)
-        wlay.addWidget(self.__mission_status_btn)
-        wlay.addWidget(self.__btn_export_all)
-        wlay.addWidget(self.__btn_precision)
-        wlay.addWidget(self.__btn_heat_map)
+        wlay.addWidget(self.__mission_controls)
 
         wlay.addStretch()
         content.resize(self.sb_width, 400)
@@ -726,6 +890,44 @@ class UpgradeDisplay(CollapseFrame):
     def update_gui_option_vars(self):
         pass
 
+_STYLE_RED = "background-color: red"
+_STYLE_GREEN = "background-color: green"
+_STYLE_YELLOW = "background-color: yellow"
+
+# Heartbeats repeat a handful of state combinations, so the result for each
+# combination is cached
+@lru_cache(maxsize=64)
+def _overall_status(sdr_status, dir_status, gps_status, sys_status, sw_status):
+    '''
+    Computes the overall system status shown by StatusDisplay
+    Args:
+        sdr_status: STS_sdr_status value
+        dir_status: STS_dir_status value
+        gps_status: STS_gps_status value
+        sys_status: STS_sys_status value
+        sw_status: STS_sw_status value
+    Returns:
+        Tuple of the status text and the label style sheet
+    '''
+    if sys_status == rctCore.RCT_STATES.finish:
+        return ('Stopping', _STYLE_RED)
+    elif sdr_status == rctCore.SDR_INIT_STATES.fail or \
+        dir_status == rctCore.OUTPUT_DIR_STATES.fail or \
+        gps_status == rctCore.EXTS_STATES.fail or \
+        sys_status == rctCore.RCT_STATES.fail or \
+        (sw_status != 0 and sw_status != 1):
+        return ('Failed', _STYLE_RED)
+    elif sys_status == rctCore.RCT_STATES.start or \
+        sys_status == rctCore.RCT_STATES.wait_end:
+        return ('Running', _STYLE_GREEN)
+    elif sdr_status == rctCore.SDR_INIT_STATES.rdy and \
+        dir_status == rctCore.OUTPUT_DIR_STATES.rdy and \
+        gps_status == rctCore.EXTS_STATES.rdy and \
+        sys_status == rctCore.RCT_STATES.wait_start and sw_status == 1:
+        return ('Idle', _STYLE_YELLOW)
+    else:
+        return ('Not Connected', _STYLE_YELLOW)
+
 class StatusDisplay(CollapseFrame):
     '''
     Custom widget to display system status
@@ -774,35 +976,12 @@ class StatusDisplay(CollapseFrame):
     def update_gui_option_vars(self, scope=0):
         var_dict = self.__root._mav_model.state
 
-        sdr_status = var_dict["STS_sdr_status"]
-        dir_status = var_dict["STS_dir_status"]
-        gps_status = var_dict["STS_gps_status"]
-        sys_status = var_dict["STS_sys_status"]
-        sw_status = var_dict["STS_sw_status"]
-
-        if sys_status == rctCore.RCT_STATES.finish:
-            self.status_label.setText('Stopping')
-            self.status_label.setStyleSheet("background-color: red")
-        elif sdr_status == rctCore.SDR_INIT_STATES.fail or \
-            dir_status == rctCore.OUTPUT_DIR_STATES.fail or \
-            gps_status == rctCore.EXTS_STATES.fail or \
-            sys_status == rctCore.RCT_STATES.fail or \
-            (sw_status != 0 and sw_status != 1):
-            self.status_label.setText('Failed')
-            self.status_label.setStyleSheet("background-color: red")
-        elif sys_status == rctCore.RCT_STATES.start or \
-            sys_status == rctCore.RCT_STATES.wait_end:
-            self.status_label.setText('Running')
-            self.status_label.setStyleSheet("background-color: green")
-        elif sdr_status == rctCore.SDR_INIT_STATES.rdy and \
-            dir_status == rctCore.OUTPUT_DIR_STATES.rdy and \
-            gps_status == rctCore.EXTS_STATES.rdy and \
-            sys_status == rctCore.RCT_STATES.wait_start and sw_status == 1:
-            self.status_label.setText('Idle')
-            self.status_label.setStyleSheet("background-color: yellow")
-        else:
-            self.status_label.setText('Not Connected')
-            self.status_label.setStyleSheet("background-color: yellow")
+        statuses = (var_dict["STS_sdr_status"], var_dict["STS_dir_status"],
+                    var_dict["STS_gps_status"], var_dict["STS_sys_status"],
+                    var_dict["STS_sw_status"])
+        text, style = _overall_status(*statuses)
+        self.status_label.setText(text)
+        self.status_label.setStyleSheet(style)
 
         self.component_status_widget.update()
 
@@ -811,6 +990,69 @@ class ComponentStatusDisplay(CollapseFrame):
     Custom widget class to display the current statuses of system
     components
     '''
+    # Status tables are shared by every instance
+    sdr_map = {
+        "SDR_INIT_STATES.find_devices": {'text': 'SDR: Searching for devices', 'bg':'yellow'},
+        "SDR_INIT_STATES.wait_recycle": {'text':'SDR: Recycling!', 'bg':'yellow'},
+        "SDR_INIT_STATES.usrp_probe": {'text':'SDR: Initializing SDR', 'bg':'yellow'},
+        "SDR_INIT_STATES.rdy": {'text':'SDR: Ready', 'bg':'green'},
+        "SDR_INIT_STATES.fail": {'text':'SDR: Failed!', 'bg':'red'}
+    }
+
+    dir_map = {
+        "OUTPUT_DIR_STATES.get_output_dir": {'text':'DIR: Searching', 'bg':'yellow'},
+        "OUTPUT_DIR_STATES.check_output_dir": {'text':'DIR: Checking for mount', 'bg':'yellow'},
+        "OUTPUT_DIR_STATES.check_space": {'text':'DIR: Checking for space', 'bg':'yellow'},
+        "OUTPUT_DIR_STATES.wait_recycle": {'text':'DIR: Recycling!', 'bg':'yellow'},
+        "OUTPUT_DIR_STATES.rdy": {'text':'DIR: Ready', 'bg':'green'},
+        "OUTPUT_DIR_STATES.fail": {'text':'DIR: Failed!', 'bg':'red'},
+    }
+
+    gps_map = {
+        "EXTS_STATES.get_tty": {'text': 'GPS: Getting TTY Device', 'bg': 'yellow'},
+        "EXTS_STATES.get_msg": {'text': 'GPS: Waiting for message', 'bg': 'yellow'},
+        "EXTS_STATES.wait_recycle": {'text': 'GPS: Recycling', 'bg': 'yellow'},
+        "EXTS_STATES.rdy": {'text': 'GPS: Ready', 'bg': 'green'},
+        "EXTS_STATES.fail": {'text': 'GPS: Failed!', 'bg': 'red'}
+    }
+
+    sys_map = {
+        "RCT_STATES.init": {'text': 'SYS: Initializing', 'bg': 'yellow'},
+        "RCT_STATES.wait_init": {'text': 'SYS: Initializing', 'bg': 'yellow'},
+        "RCT_STATES.wait_start": {'text': 'SYS: Ready for start', 'bg': 'green'},
+        "RCT_STATES.start": {'text': 'SYS: Starting', 'bg': 'blue'},
+        "RCT_STATES.wait_end": {'text': 'SYS: Running', 'bg': 'blue'},
+        "RCT_STATES.finish": {'text': 'SYS: Stopping', 'bg': 'blue'},
+        "RCT_STATES.fail": {'text': 'SYS: Failed!', 'bg': 'red'},
+    }
+
+    sw_map = {
+        '0': {'text': 'SW: OFF', 'bg': 'yellow'},
+        '1': {'text': 'SW: ON', 'bg': 'green'},
+    }
+
+    comp_dict = {
+        "STS_sdr_status": sdr_map,
+        "STS_dir_status": dir_map,
+        "STS_gps_status": gps_map,
+        "STS_sys_status": sys_map,
+        "STS_sw_status": sw_map,
+    }
+
+    # Flattened (state variable, state string) -> (text, style sheet) table,
+    # so that an update is a single lookup.  The state strings are interned,
+    # as are the strings looked up in it (see _state_keys), so they match by
+    # identity
+    _status_map = {
+        (var_name, sys.intern(key)):
+            (opts['text'], sys.intern("background-color: %s" % opts['bg']))
+        for var_name, table in comp_dict.items()
+        for key, opts in table.items()
+    }
+
+    # Interned str() of each state value seen so far
+    _state_keys = {}
+
     def __init__(self, root: GCS):
         '''
         Creates a ComponentStatusDisplay object
@@ -819,57 +1061,10 @@ class ComponentStatusDisplay(CollapseFrame):
         '''
         CollapseFrame.__init__(self, 'Component Statuses')
         self.user_pops = UserPopups()
-        self.sdr_map = {
-            "SDR_INIT_STATES.find_devices": {'text': 'SDR: Searching for devices', 'bg':'yellow'},
-            "SDR_INIT_STATES.wait_recycle": {'text':'SDR: Recycling!', 'bg':'yellow'},
-            "SDR_INIT_STATES.usrp_probe": {'text':'SDR: Initializing SDR', 'bg':'yellow'},
-            "SDR_INIT_STATES.rdy": {'text':'SDR: Ready', 'bg':'green'},
-            "SDR_INIT_STATES.fail": {'text':'SDR: Failed!', 'bg':'red'}
-        }
-
-        self.dir_map = {
-            "OUTPUT_DIR_STATES.get_output_dir": {'text':'DIR: Searching', 'bg':'yellow'},
-            "OUTPUT_DIR_STATES.check_output_dir": {'text':'DIR: Checking for mount', 'bg':'yellow'},
-            "OUTPUT_DIR_STATES.check_space": {'text':'DIR: Checking for space', 'bg':'yellow'},
-            "OUTPUT_DIR_STATES.wait_recycle": {'text':'DIR: Recycling!', 'bg':'yellow'},
-            "OUTPUT_DIR_STATES.rdy": {'text':'DIR: Ready', 'bg':'green'},
-            "OUTPUT_DIR_STATES.fail": {'text':'DIR: Failed!', 'bg':'red'},
-        }
-
-        self.gps_map = {
-            "EXTS_STATES.get_tty": {'text': 'GPS: Getting TTY Device', 'bg': 'yellow'},
-            "EXTS_STATES.get_msg": {'text': 'GPS: Waiting for message', 'bg': 'yellow'},
-            "EXTS_STATES.wait_recycle": {'text': 'GPS: Recycling', 'bg': 'yellow'},
-            "EXTS_STATES.rdy": {'text': 'GPS: Ready', 'bg': 'green'},
-            "EXTS_STATES.fail": {'text': 'GPS: Failed!', 'bg': 'red'}
-        }
-
-        self.sys_map = {
-            "RCT_STATES.init": {'text': 'SYS: Initializing', 'bg': 'yellow'},
-            "RCT_STATES.wait_init": {'text': 'SYS: Initializing', 'bg': 'yellow'},
-            "RCT_STATES.wait_start": {'text': 'SYS: Ready for start', 'bg': 'green'},
-            "RCT_STATES.start": {'text': 'SYS: Starting', 'bg': 'blue'},
-            "RCT_STATES.wait_end": {'text': 'SYS: Running', 'bg': 'blue'},
-            "RCT_STATES.finish": {'text': 'SYS: Stopping', 'bg': 'blue'},
-            "RCT_STATES.fail": {'text': 'SYS: Failed!', 'bg': 'red'},
-        }
-
-        self.sw_map = {
-            '0': {'text': 'SW: OFF', 'bg': 'yellow'},
-            '1': {'text': 'SW: ON', 'bg': 'green'},
-        }
-
-        self.comp_dict = {
-            "STS_sdr_status": self.sdr_map,
-            "STS_dir_status": self.dir_map,
-            "STS_gps_status": self.gps_map,
-            "STS_sys_status": self.sys_map,
-            "STS_sw_status": self.sw_map,
-        }
-
         self.__root = root
         self.inner_frame = None
         self.status_labels = {}
+        self.__last_state = {}
         self.__create_widget()
 
     def update(self):
@@ -920,20 +1115,28 @@ class ComponentStatusDisplay(CollapseFrame):
 
     def update_gui_option_vars(self, scope=0):
         var_dict = self.__root._mav_model.state
-        for var_name, var_value in var_dict.items():
-            try:
-                if var_name in self.comp_dict:
-                    config_dict = self.comp_dict[var_name]
-                    if str(var_value) in config_dict:
-                        config_opts = config_dict[str(var_value)]
-                        if var_name in self.status_labels:
-                            self.status_labels[var_name].setText(config_opts['text'])
-                        style = "background-color: %s" % config_opts['bg']
-                        if var_name in self.status_labels:
-                            self.status_labels[var_name].setStyleSheet(style)
-            except KeyError:
-                self.user_pops.show_warning("Failed to update GUI option vars", "Unexpected Error")
+        last_state = self.__last_state
+        state_keys = self._state_keys
+        status_map = self._status_map
+        status_labels = self.status_labels
+        # Only the component statuses are displayed, so look those up rather
+        # than walking every state variable
+        for var_name in self.comp_dict:
+            var_value = var_dict.get(var_name)
+            # setStyleSheet restyles the label, so skip unchanged statuses
+            if var_value is None or last_state.get(var_name) == var_value:
+                continue
+            last_state[var_name] = var_value
+            key = state_keys.get(var_value)
+            if key is None:
+                key = state_keys[var_value] = sys.intern(str(var_value))
+            status = status_map.get((var_name, key))
+            if status is None:
                 continue
+            text, style = status
+            label = status_labels[var_name]
+            label.setText(text)
+            label.setStyleSheet(style)
 
 class MapControl(CollapseFrame):
     '''
@@ -950,6 +1153,9 @@ class MapControl(CollapseFrame):
         self.__lon_entry = None
         self.__zoom_entry = None
         self.user_pops = UserPopups()
+        self.__log = logging.getLogger('rctGCS.MapControl')
+        # Corners of the web map being shown, None if it is another map
+        self.__web_map_coords = None
         self.__create_widgets()
 
     def __create_widgets(self):
@@ -1058,6 +1264,12 @@ class MapControl(CollapseFrame):
         Internal function to load map from web
         '''
         p1_lat, p1_lon, p2_lat, p2_lon = self.__init_lat_lon()
+        coords = (p1_lat, p1_lon, p2_lat, p2_lon)
+        # The same web map is already showing, don't fetch its tiles again
+        if self.__web_map_coords is not None and all(
+                abs(new - old) < 1e-6
+                for new, old in zip(coords, self.__web_map_coords)):
+            return
         try:
             temp = WebMap(self.__holder, p1_lat, p1_lon, p2_lat, p2_lon, False)
         except RuntimeError:
@@ -1065,6 +1277,7 @@ class MapControl(CollapseFrame):
             return
         self.__map_frame.setParent(None)
         self.__map_frame = temp
+        self.__web_map_coords = coords
         self.__map_frame.resize(800, 500)
         self.__map_options.set_map(self.__map_frame, True)
         self.__root.set_map(self.__map_frame)
@@ -1074,6 +1287,7 @@ class MapControl(CollapseFrame):
         Internal function to load map from cached tiles
         '''
         p1_lat, p1_lon, p2_lat, p2_lon = self.__init_lat_lon()
+        self.__web_map_coords = None
         self.__map_frame.setParent(None)
         self.__map_frame = WebMap(self.__holder, p1_lat, p1_lon,
                 p2_lat, p2_lon, True)
@@ -1085,11 +1299,12 @@ class MapControl(CollapseFrame):
         '''
         Internal function to load user-specified raster file
         '''
+        self.__web_map_coords = None
         self.__map_frame.setParent(None)
         try:
             self.__map_frame = StaticMap(self.__holder)
         except FileNotFoundError as e:
-            print(e)
+            self.__log.warning('Failed to load map file: %s', e)
             self.__load_web_map()
         else:
             self.__map_frame.resize(800, 500)
@@ -1,11 +1,15 @@
 import csv
-import math
+import logging
 import os
 import os.path
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from threading import Thread
 
+import numpy as np
 import requests
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
@@ -23,6 +27,202 @@ from qgis.core import QgsProject
 from qgis.utils import *
 
 
+# The CRS objects can only be built once QGIS has been initialized, so they
+# are created on first use and then shared
+@lru_cache(maxsize=None)
+def web_mercator_crs():
+    '''
+    Returns the shared EPSG:3857 QgsCoordinateReferenceSystem
+    '''
+    return QgsCoordinateReferenceSystem("EPSG:3857")
+
+@lru_cache(maxsize=None)
+def wgs84_crs():
+    '''
+    Returns the shared EPSG:4326 QgsCoordinateReferenceSystem
+    '''
+    return QgsCoordinateReferenceSystem("EPSG:4326")
+
+# Like the CRS objects, the style lookups below are made once and shared.
+# Callers must clone the returned objects before handing them to a renderer,
+# which takes ownership of what it is given.
+@lru_cache(maxsize=None)
+def default_point_symbol():
+    '''
+    Returns the shared prototype of the default point symbol
+    '''
+    return QgsSymbol.defaultSymbol(QgsWkbTypes.PointGeometry)
+
+@lru_cache(maxsize=None)
+def ping_color_ramp():
+    '''
+    Returns the shared prototype of the ping layer's source color ramp
+    '''
+    style = QgsStyle.defaultStyle()
+    return style.colorRamp(style.colorRampNames()[22])
+
+# WGS84 semi-major axis used by the EPSG:3857 projection
+_WEB_MERCATOR_RADIUS = 6378137.0
+
+def web_mercator_points(lats, lons):
+    '''
+    Projects EPSG:4326 coordinates to EPSG:3857 with the closed form
+    spherical Mercator equations instead of a QgsCoordinateTransform call
+    per point
+    Args:
+        lats: Sequence of latitudes in degrees
+        lons: Sequence of longitudes in degrees
+    Returns:
+        List of EPSG:3857 QgsPointXY
+    '''
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    x = _WEB_MERCATOR_RADIUS * np.deg2rad(lons)
+    y = _WEB_MERCATOR_RADIUS * np.log(np.tan(np.pi / 4 + np.deg2rad(lats) / 2))
+    return [QgsPointXY(px, py) for px, py in zip(x.tolist(), y.tolist())]
+
+# Mean earth radius in meters used for haversine distances
+_EARTH_RADIUS = 6371000.0
+
+def haversine(lat1, lat2, lon1, lon2):
+    '''
+    Great circle distance between two sets of EPSG:4326 points.  Accepts
+    scalars or equal length arrays.
+    Args:
+        lat1: Latitudes of the first points in degrees
+        lat2: Latitudes of the second points in degrees
+        lon1: Longitudes of the first points in degrees
+        lon2: Longitudes of the second points in degrees
+    Returns:
+        Distance in meters, as a scalar or array matching the inputs
+    '''
+    lat1 = np.deg2rad(lat1)
+    lat2 = np.deg2rad(lat2)
+    dlat = lat2 - lat1
+    dlon = np.deg2rad(np.subtract(lon2, lon1))
+    a = np.sin(dlat / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2)**2
+    return 2 * _EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+def simplify_on_render(layer):
+    '''
+    Lets QGIS drop sub-pixel vertices of a line or polygon layer when it is
+    drawn.  The stored features are not modified.
+    Args:
+        layer: The QgsVectorLayer to configure
+    '''
+    method = QgsVectorSimplifyMethod()
+    method.setSimplifyHints(QgsVectorSimplifyMethod.SimplifyHints(
+            QgsVectorSimplifyMethod.GeometrySimplification |
+            QgsVectorSimplifyMethod.AntialiasingSimplification))
+    method.setThreshold(1.0)
+    method.setForceLocalOptimization(True)
+    layer.setSimplifyMethod(method)
+
+def tile_numbers(lat_deg, lon_deg, zoom):
+    '''
+    Calculates the slippy map tile numbers containing the given locations
+    Args:
+        lat_deg: Latitude or array of latitudes in degrees
+        lon_deg: Longitude or array of longitudes in degrees
+        zoom: integer zoom value
+    Returns:
+        Tuple of integer arrays of the tile x and y numbers
+    '''
+    lat_rad = np.radians(lat_deg)
+    n = 2.0 ** zoom
+    x = np.floor((np.asarray(lon_deg) + 180.0) / 360.0 * n).astype(int)
+    y = np.floor((1.0 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2.0 * n).astype(int)
+    return (x, y)
+
+# Tile server request settings, the tile server requires an up to date user
+# agent
+_TILE_USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/101.0.4951.54 Safari/537.36'
+_TILE_REQUEST_RATE = 1.0
+_TILE_WORKERS = 4
+_TILE_LIMIT = 200
+_TILE_CHUNK_SIZE = 32768
+
+
+class TileRateLimiter:
+    '''
+    Spaces out tile requests made from several download threads so that
+    together they stay under a fixed request rate
+    '''
+    def __init__(self, rate: float):
+        '''
+        Creates a TileRateLimiter
+        Args:
+            rate: Maximum requests per second
+        '''
+        self.__interval = 1.0 / rate
+        self.__lock = threading.Lock()
+        self.__next_slot = time.monotonic()
+
+    def acquire(self):
+        '''
+        Blocks until the calling thread may make its request
+        '''
+        with self.__lock:
+            now = time.monotonic()
+            slot = max(now, self.__next_slot)
+            self.__next_slot = slot + self.__interval
+        if slot > now:
+            time.sleep(slot - now)
+
+# Delimited text URI of the precision points written by
+# LocationEstimator.doPrecision, relative to the working directory
+_PRECISION_URI_TEMPLATE = ('file:///{path}/holder/query.csv?encoding=UTF-8'
+                           '&delimiter=,&xField=easting&yField=northing'
+                           '&crs=epsg:32611&value=value')
+
+# Number of vehicle path segments merged into one polyline feature
+_PATH_MERGE_SIZE = 100
+
+# Initial ping renderer ranges as (lower, upper, color, label).  The web map
+# splits the amplitude span into seven ranges, the static map into five.
+_PING_RANGES = (
+    (0, 10, '#0000FF', 'Blue'),
+    (10, 20, '#00FFFF', 'Cyan'),
+    (20, 40, '#00FF00', 'Green'),
+    (40, 60, '#FFFF00', 'Yellow'),
+    (60, 80, '#FFC400', 'Orange'),
+    (80, 90, '#FFA000', 'ORed'),
+    (90, 100, '#FF0000', 'Red'),
+)
+_STATIC_PING_RANGES = (
+    (0, 20, '#0000FF', 'Blue'),
+    (20, 40, '#00FF00', 'Green'),
+    (40, 60, '#FFFF00', 'Yellow'),
+    (60, 80, '#FFA500', 'Orange'),
+    (80, 100, '#FF0000', 'Red'),
+)
+
+def _make_symbol(proto, color):
+    '''
+    Clones a prototype symbol and sets its color
+    Args:
+        proto: The QgsSymbol to clone
+        color: Color name or hex string for the new symbol
+    Returns:
+        The new QgsSymbol
+    '''
+    symbol = proto.clone()
+    symbol.setColor(QColor(color))
+    return symbol
+
+# Ping renderer ranges as (label, lower, upper) fractions of the observed
+# amplitude span
+_PING_RANGE_FRACTIONS = (
+    ('Blue', 0.0, 0.14),
+    ('Cyan', 0.14, 0.28),
+    ('Green', 0.28, 0.42),
+    ('Yellow', 0.42, 0.56),
+    ('Orange', 0.56, 0.7),
+    ('ORed', 0.7, 0.84),
+    ('Red', 0.84, 1.0),
+)
+
+
 class RectangleMapTool(qgis.gui.QgsMapToolEmitPoint):
     '''
     Custom QgsMapTool to select a rectangular area of a QgsMapCanvas
@@ -39,6 +239,12 @@ class RectangleMapTool(qgis.gui.QgsMapToolEmitPoint):
         self.rubber_band = qgis.gui.QgsRubberBand(self.canvas, True)
         self.rubber_band.setColor(QColor(0,255,255,125))
         self.rubber_band.setWidth(1)
+        # Coalesces move events so the rubber band is redrawn at most once
+        # per interval while dragging
+        self.__move_timer = QTimer(self)
+        self.__move_timer.setSingleShot(True)
+        self.__move_timer.setInterval(8)
+        self.__move_timer.timeout.connect(self.__flush_move)
         self.reset()
 
     def reset(self):
@@ -46,6 +252,7 @@ class RectangleMapTool(qgis.gui.QgsMapToolEmitPoint):
         '''
         self.start_point = self.end_point = None
         self.is_emitting_point = False
+        self.last_pixel = None
         self.rubber_band.reset(True)
 
     def canvasPressEvent(self, e):
@@ -58,6 +265,7 @@ class RectangleMapTool(qgis.gui.QgsMapToolEmitPoint):
         self.start_point = self.toMapCoordinates(e.pos())
         self.end_point = self.start_point
         self.is_emitting_point = True
+        self.last_pixel = (e.pos().x(), e.pos().y())
         self.show_rect(self.start_point, self.end_point)
 
     def canvasReleaseEvent(self, e):
@@ -79,27 +287,39 @@ class RectangleMapTool(qgis.gui.QgsMapToolEmitPoint):
         if not self.is_emitting_point:
             return
 
-        self.end_point = self.toMapCoordinates(e.pos())
-        self.show_rect(self.start_point, self.end_point)
+        # Moves within the same pixel cannot change the drawing
+        pos = e.pos()
+        pixel = (pos.x(), pos.y())
+        if pixel == self.last_pixel:
+            return
+        self.last_pixel = pixel
+
+        self.end_point = self.toMapCoordinates(pos)
+        if not self.__move_timer.isActive():
+            self.__move_timer.start()
+
+    def __flush_move(self):
+        '''
+        Internal callback to redraw the rectangle at the latest end point
+        once the move timer expires
+        '''
+        if self.is_emitting_point:
+            self.show_rect(self.start_point, self.end_point)
 
     def show_rect(self, start_point, end_point):
         '''
         Internal function to display the rectangle being
         specified by the user
         '''
-        self.rubber_band.reset(QgsWkbTypes.PolygonGeometry)
-        if start_point.x() == end_point.x() or start_point.y() == end_point.y():
+        sx, sy = start_point.x(), start_point.y()
+        ex, ey = end_point.x(), end_point.y()
+        if sx == ex or sy == ey:
+            self.rubber_band.reset(QgsWkbTypes.PolygonGeometry)
             return
 
-        point1 = QgsPointXY(start_point.x(), start_point.y())
-        point2 = QgsPointXY(start_point.x(), end_point.y())
-        point3 = QgsPointXY(end_point.x(), end_point.y())
-        point4 = QgsPointXY(end_point.x(), start_point.y())
-
-        self.rubber_band.addPoint(point1, False)
-        self.rubber_band.addPoint(point2, False)
-        self.rubber_band.addPoint(point3, False)
-        self.rubber_band.addPoint(point4, True)    # true to update canvas
+        # One geometry hand-off instead of a repaint per corner
+        self.rubber_band.setToGeometry(QgsGeometry.fromRect(
+                QgsRectangle(start_point, end_point)), None)
         self.rubber_band.show()
 
     def rectangle(self):
@@ -127,58 +347,96 @@ class PolygonMapTool(qgis.gui.QgsMapToolEmitPoint):
         qgis.gui.QgsMapToolEmitPoint.__init__(self, self.canvas)
         #Creating a list for all vertex coordinates
         self.vertices = []
+        # Geometry of the committed vertices, rebuilt only when a vertex is
+        # added or the vertex list is cleared
+        self.__committed_geom = None
+        self.__committed_count = 0
         self.rubber_band = qgis.gui.QgsRubberBand(self.canvas,
             QgsWkbTypes.PolygonGeometry)
         self.rubber_band.setColor(Qt.red)
         self.rubber_band.setWidth(1)
+        # The moving edge, from the last vertex to the cursor, is drawn on
+        # its own band so that the committed polygon is never rebuilt while
+        # dragging
+        self.edge_band = qgis.gui.QgsRubberBand(self.canvas,
+            QgsWkbTypes.LineGeometry)
+        self.edge_band.setColor(Qt.red)
+        self.edge_band.setWidth(1)
+        self.__move_timer = QTimer(self)
+        self.__move_timer.setSingleShot(True)
+        self.__move_timer.setInterval(8)
+        self.__move_timer.timeout.connect(self.__flush_move)
         self.reset()
 
     def reset(self):
         self.start_point = self.end_point = None
         self.is_emitting_point = False
+        self.last_pixel = None
         self.rubber_band.reset(True)
+        self.edge_band.reset(QgsWkbTypes.LineGeometry)
 
     def canvasPressEvent(self, e):
         self.start_point = self.toMapCoordinates(e.pos())
         self.end_point = self.start_point
         self.is_emitting_point = True
+        self.last_pixel = (e.pos().x(), e.pos().y())
         self.add_vertex(self.start_point, self.canvas)
         self.show_line(self.start_point, self.end_point)
         self.show_polygon()
 
     def canvasReleaseEvent(self, e):
         self.is_emitting_point = False
+        self.edge_band.reset(QgsWkbTypes.LineGeometry)
 
     def canvasMoveEvent(self, e):
         if not self.is_emitting_point:
             return
 
-        self.end_point = self.toMapCoordinates(e.pos())
-        self.show_line(self.start_point, self.end_point)
+        # Moves within the same pixel cannot change the drawing
+        pos = e.pos()
+        pixel = (pos.x(), pos.y())
+        if pixel == self.last_pixel:
+            return
+        self.last_pixel = pixel
+
+        self.end_point = self.toMapCoordinates(pos)
+        if not self.__move_timer.isActive():
+            self.__move_timer.start()
+
+    def __flush_move(self):
+        if self.is_emitting_point:
+            self.show_line(self.start_point, self.end_point)
 
     def add_vertex(self, selectPoint, canvas):
         vertex = QgsPointXY(selectPoint)
         self.vertices.append(vertex)
+        self.__committed_geom = None
+
+    def committed_geometry(self):
+        '''
+        Returns the polygon geometry of the committed vertices, building it
+        only if the vertices changed since the last call
+        '''
+        if (self.__committed_geom is None or
+                self.__committed_count != len(self.vertices)):
+            self.__committed_geom = QgsGeometry.fromPolygonXY([self.vertices])
+            self.__committed_count = len(self.vertices)
+        return self.__committed_geom
 
     def show_polygon(self):
         if (len(self.vertices) > 1):
-            self.rubber_band.reset(QgsWkbTypes.PolygonGeometry)
-            r = len(self.vertices) - 1
-            for i in range(r):
-                self.rubber_band.addPoint(self.vertices[i], False)
-            self.rubber_band.addPoint(self.vertices[r], True)
+            self.rubber_band.setToGeometry(self.committed_geometry(), None)
             self.rubber_band.show()
 
     def show_line(self, start_point, end_point):
-        self.rubber_band.reset(QgsWkbTypes.PolygonGeometry)
-        if start_point.x() == end_point.x() or start_point.y() == end_point.y():
+        self.edge_band.reset(QgsWkbTypes.LineGeometry)
+        if start_point == end_point:
             return
 
-        point1 = QgsPointXY(start_point.x(), start_point.y())
+        self.edge_band.addPoint(QgsPointXY(start_point), False)
+        self.edge_band.addPoint(QgsPointXY(end_point), True)
 
-        self.rubber_band.addPoint(point1, True)
-
-        self.rubber_band.show()
+        self.edge_band.show()
 
     def deactivate(self):
         qgis.gui.QgsMapTool.deactivate(self)
@@ -191,6 +449,9 @@ class VehicleData:
     def __init__(self):
         self.ind = 0
         self.last_loc = None
+        # Points and feature ids of the path segments not yet merged
+        self.path_points = []
+        self.path_ids = []
 
 class MapWidget(QWidget):
     '''
@@ -203,21 +464,29 @@ class MapWidget(QWidget):
             root: The root widget of the application
         '''
         QWidget.__init__(self)
+        self.__log = logging.getLogger('rctGCS.MapWidget')
         self.holder = QVBoxLayout()
         self.ground_truth = None
         self.map_layer = None
         self.vehicle = None
         self.vehicle_path = None
         self.precision = None
+        # the precision layer reads holder/query.csv, so it is only set up
+        # when asked for
+        self.enable_precision = False
         self.cones = None
         self.vehicle_data = {}
         self.ping_layer = None
         self.ping_renderer = None
+        self.ping_fields = None
         self.estimate = None
         self.tool_polygon = None
-        self.polygon_layer = None
         self.polygon_action = None
         self.heat_map = None
+        self.__heat_map_renderer = None
+        self.__heat_map_max = None
+        self.__working_dir = QDir().currentPath()
+        self.__layer_key = None
         self.ping_min = 800
         self.ping_max = 0
         self.cone_min = sys.float_info.max
@@ -226,18 +495,29 @@ class MapWidget(QWidget):
         self.ind_ping = 0
         self.ind_est = 0
         self.ind_cone = 0
+        # New ping and vehicle path features are buffered and committed to
+        # their layers in one provider call per flush interval
+        self.__ping_buffer = []
+        self.__path_buffer = []
+        self.__path_owners = []
+        # Layers whose extents are recomputed at the next flush
+        self.__stale_extents = set()
+        self.__flush_timer = QTimer(self)
+        self.__flush_timer.setSingleShot(True)
+        self.__flush_timer.setInterval(200)
+        self.__flush_timer.timeout.connect(self.flush)
         self.toolbar = QToolBar()
         self.canvas = qgis.gui.QgsMapCanvas()
         self.canvas.setCanvasColor(Qt.white)
+        # Keep each layer's last render so that replacing or repainting one
+        # layer does not redraw the rest of the stack
+        self.canvas.setCachingEnabled(True)
+        self.canvas.setPreviewJobsEnabled(True)
 
         self.transform_to_web = QgsCoordinateTransform(
-                QgsCoordinateReferenceSystem("EPSG:4326"),
-                QgsCoordinateReferenceSystem("EPSG:3857"),
-                QgsProject.instance())
+                wgs84_crs(), web_mercator_crs(), QgsProject.instance())
         self.transform = QgsCoordinateTransform(
-                QgsCoordinateReferenceSystem("EPSG:3857"),
-                QgsCoordinateReferenceSystem("EPSG:4326"),
-                QgsProject.instance())
+                web_mercator_crs(), wgs84_crs(), QgsProject.instance())
 
     def set_up_heat_map(self):
         '''
@@ -245,53 +525,44 @@ class MapWidget(QWidget):
         Args:
         '''
         file_name = QFileDialog.getOpenFileName()
-        print(file_name[0])
-        if self.heat_map is not None:
-            QgsProject.instance().removemap_layer(self.heat_map)
+        self.__log.debug('Heat map file: %s', file_name[0])
         if file_name is not None:
-            self.heat_map = QgsRasterLayer(file_name[0], "heat_map")
-
-            stats = self.heat_map.dataProvider().bandStatistics(1)
-            max_val = stats.maximumValue
-            print(max_val)
-            fcn = QgsColorRampShader()
-            fcn.setColorRampType(QgsColorRampShader.Interpolated)
-            lst = [ QgsColorRampShader.ColorRampItem(0, QColor(0,0,0)),
-                QgsColorRampShader.ColorRampItem(max_val, QColor(255,255,255)) ]
-            fcn.setColorRampItemList(lst)
-            shader = QgsRasterShader()
-            shader.setRasterShaderFunction(fcn)
-
-            renderer = QgsSingleBandPseudoColorRenderer(self.heat_map.dataProvider(), 1, shader)
-            self.heat_map.setRenderer(renderer)
-
-            QgsProject.instance().add_map_layer(self.heat_map)
-            dest_crs = self.map_layer.crs()
-            raster_crs = self.heat_map.crs()
-
-            self.heat_map.setCrs(raster_crs)
-            self.canvas.setDestinationCrs(dest_crs)
+            self.__show_heat_map(file_name[0])
 
+    def plot_precision(self, coord, freq, num_pings):
+        output_file_name = '/%s/PRECISION_%03.3f_%d_heat_map.tiff' % (
+                'holder', freq / 1e7, num_pings)
+        file_name = self.__working_dir + output_file_name
+        self.__log.debug('Precision map file: %s', file_name)
 
-            self.canvas.setLayers([self.heat_map, self.estimate, self.ground_truth,
-                               self.vehicle, self.ping_layer,
-                               self.vehicle_path, self.map_layer])
+        # the precision points have just been rewritten, reload them once
+        # rather than polling the file
+        if self.precision is not None:
+            self.precision.dataProvider().reloadData()
+            self.precision.triggerRepaint()
 
-    def plot_precision(self, coord, freq, num_pings):
-        data_dir = 'holder'
-        output_file_name = '/%s/PRECISION_%03.3f_%d_heat_map.tiff' % (data_dir, freq / 1e7, num_pings)
-        file_name = QDir().currentPath() + output_file_name
-        print(file_name)
-        print(output_file_name)
+        self.__show_heat_map(file_name)
+        self.heat_map.renderer().setOpacity(0.7)
 
+    def __show_heat_map(self, file_name):
+        '''
+        Replaces the heat_map layer with the given raster, styled as a black
+        to white ramp over its value range
+        Args:
+            file_name: Path to the heat map raster
+        '''
         if self.heat_map is not None:
-            QgsProject.instance().removemap_layer(self.heat_map)
-        if file_name is not None:
-            self.heat_map = QgsRasterLayer(file_name, "heat_map")
-
-            stats = self.heat_map.dataProvider().bandStatistics(1)
-            max_val = stats.maximumValue
-            print(max_val)
+            QgsProject.instance().removeMapLayer(self.heat_map)
+        self.heat_map = QgsRasterLayer(file_name, "heat_map")
+        provider = self.heat_map.dataProvider()
+
+        stats = provider.bandStatistics(1)
+        max_val = stats.maximumValue
+        self.__log.debug('Heat map maximum: %s', max_val)
+        # Successive precision maps usually share their maximum, in which
+        # case the last renderer is copied rather than rebuilt
+        if (self.__heat_map_renderer is None or
+                abs(max_val - self.__heat_map_max) > 1e-9):
             fcn = QgsColorRampShader()
             fcn.setColorRampType(QgsColorRampShader.Interpolated)
             lst = [ QgsColorRampShader.ColorRampItem(0, QColor(0,0,0)),
@@ -300,29 +571,45 @@ class MapWidget(QWidget):
             shader = QgsRasterShader()
             shader.setRasterShaderFunction(fcn)
 
-            renderer = QgsSingleBandPseudoColorRenderer(self.heat_map.dataProvider(), 1, shader)
-            self.heat_map.setRenderer(renderer)
+            self.__heat_map_renderer = QgsSingleBandPseudoColorRenderer(
+                    None, 1, shader)
+            self.__heat_map_max = max_val
+        renderer = self.__heat_map_renderer.clone()
+        renderer.setInput(provider)
+        self.heat_map.setRenderer(renderer)
+
+        QgsProject.instance().addMapLayer(self.heat_map)
+        dest_crs = self.map_layer.crs()
+        raster_crs = self.heat_map.crs()
 
-            QgsProject.instance().add_map_layer(self.heat_map)
-            dest_crs = self.map_layer.crs()
-            raster_crs = self.heat_map.crs()
+        self.heat_map.setCrs(raster_crs)
+        self.canvas.setDestinationCrs(dest_crs)
 
-            self.heat_map.setCrs(raster_crs)
-            self.canvas.setDestinationCrs(dest_crs)
-            self.heat_map.renderer().setOpacity(0.7)
+        self.set_layers(self.heat_map)
 
-            self.canvas.setLayers([self.heat_map, self.estimate,
-                        self.ground_truth, self.vehicle, self.ping_layer,
-                        self.vehicle_path, self.map_layer])
+    def set_layers(self, overlay):
+        '''
+        Sets the canvas layer stack, skipping the call if the stack has not
+        changed since it was last set
+        Args:
+            overlay: The raster layer to draw above the vector layers, the
+                     precision layer or the heat map
+        '''
+        layers = [overlay, self.estimate, self.ground_truth, self.vehicle,
+                  self.ping_layer, self.cones, self.vehicle_path,
+                  self.map_layer]
+        key = tuple(map(id, layers))
+        if key == self.__layer_key:
+            return
+        self.__layer_key = key
+        self.canvas.setLayers(layers)
 
     def adjust_canvas(self):
         '''
         Helper function to set and adjust the camvas' layers
         '''
         self.canvas.setExtent(self.map_layer.extent())
-        self.canvas.setLayers([self.precision, self.estimate, self.ground_truth,
-                               self.vehicle, self.ping_layer, self.cones,
-                               self.vehicle_path, self.polygon_layer, self.map_layer])
+        self.set_layers(self.precision)
         #self.canvas.setLayers([self.map_layer])
         self.canvas.zoomToFullExtent()
         self.canvas.freeze(True)
@@ -411,15 +698,16 @@ class MapWidget(QWidget):
             else:
                 vehicle_data = self.vehicle_data[id]
             if vehicle_data.ind > 0:
-                lpr = self.vehicle_path.dataProvider()
                 lin = QgsGeometry.fromPolylineXY([vehicle_data.last_loc, point])
                 line_feat = QgsFeature()
                 line_feat.setGeometry(lin)
-                lpr.addFeatures([line_feat])
-                vpr = self.vehicle.dataProvider()
-                self.vehicle.startEditing()
-                self.vehicle.deleteFeature(vehicle_data.ind)
-                self.vehicle.commitChanges()
+                self.__path_buffer.append(line_feat)
+                self.__path_owners.append(vehicle_data)
+                if not vehicle_data.path_points:
+                    vehicle_data.path_points.append(vehicle_data.last_loc)
+                vehicle_data.path_points.append(point)
+                self.__schedule_flush()
+                self.vehicle.dataProvider().deleteFeatures([vehicle_data.ind])
 
             vehicle_data.last_loc = point
             vpr = self.vehicle.dataProvider()
@@ -427,7 +715,9 @@ class MapWidget(QWidget):
             f = QgsFeature()
             f.setGeometry(pnt)
             vpr.addFeatures([f])
-            self.vehicle.updateExtents()
+            self.__stale_extents.add(self.vehicle)
+            self.__schedule_flush()
+            self.vehicle.triggerRepaint()
             self.ind = self.ind + 1
             vehicle_data.ind = self.ind
 
@@ -451,22 +741,22 @@ class MapWidget(QWidget):
             return
         else:
             if self.ind_cone > 4:
-                self.cones.startEditing()
-                self.cones.deleteFeature(self.ind_cone-5)
-                self.cones.commitChanges()
+                self.cones.dataProvider().deleteFeatures([self.ind_cone-5])
 
             # update cone color/length based on cone_min-cone_max range
-            update_ind = self.ind_cone
-            opacity = 1
+            # fetch the trailing cones in one provider request rather than
+            # one getFeature round trip per cone
+            fids = range(self.ind_cone, max(self.ind_cone - 5, 0), -1)
+            opacities = {fid: 1 - 0.2 * i for i, fid in enumerate(fids)}
+            request = QgsFeatureRequest().setFilterFids(list(fids))
+            request.setFlags(QgsFeatureRequest.NoGeometry)
             updates = {}
-            while update_ind >= self.ind_cone-4 and update_ind > 0:
-                feature = self.cones.getFeature(update_ind)
+            for feature in self.cones.getFeatures(request):
                 amp = feature.attributes()[1]
+                opacity = opacities[feature.id()]
                 color = self.calc_color(amp, self.cone_min, self.cone_max, opacity)
                 height = self.calc_height(amp, self.cone_min, self.cone_max)
-                updates[update_ind] = {2: color, 3: height}
-                update_ind -= 1
-                opacity -= 0.2
+                updates[feature.id()] = {2: color, 3: height}
 
             #Add new cone
             cpr = self.cones.dataProvider()
@@ -483,7 +773,8 @@ class MapWidget(QWidget):
                     self.calc_height(power, self.cone_min, self.cone_max))
             feature.setAttribute(4, "bottom")
             cpr.addFeatures([feature])
-            self.cones.updateExtents()
+            self.__stale_extents.add(self.cones)
+            self.__schedule_flush()
             self.ind_cone = self.ind_cone + 1
 
     def calc_color(self, amp, min_amp, max_amp, opac):
@@ -527,66 +818,115 @@ class MapWidget(QWidget):
                    coordinate pair
             amp: The amplitude of the ping
         '''
-        lat = coord[0]
-        lon = coord[1]
+        self.plot_pings([coord], [power])
 
-
-        change = False
-        point = self.transform_to_web.transform(QgsPointXY(lon, lat))
-        if self.ping_layer is None:
+    def plot_pings(self, coords, powers):
+        '''
+        Function to plot a batch of new pings on the ping map layer.  The
+        features are buffered and added to the layer by the next flush.
+        Args:
+            coords: Sequence of (lat, lon) EPSG:4326 coordinate pairs
+            powers: Sequence of ping amplitudes, one per coordinate
+        '''
+        if self.ping_layer is None or len(powers) == 0:
             return
 
-        else:
-            if power < self.ping_min:
-                change = True
-                self.ping_min = power
-            if power > self.ping_max:
-                change = True
-                self.ping_max = power
-            if (self.ping_max == self.ping_min):
-                self.ping_max = self.ping_max + 1
-            if change:
-                r = self.ping_max - self.ping_min
-                first = r * 0.14
-                second = r * 0.28
-                third = r * 0.42
-                fourth = r * 0.56
-                fifth = r * 0.7
-                sixth = r * 0.84
-
-                for i, range_obj in enumerate(self.ping_renderer.ranges()):
-                    if range_obj.label() == 'Blue':
-                        self.ping_renderer.updateRangeLowerValue(i, self.ping_min)
-                        self.ping_renderer.updateRangeUpperValue(i, self.ping_min + first)
-                    if range_obj.label() == 'Cyan':
-                        self.ping_renderer.updateRangeLowerValue(i, self.ping_min + first)
-                        self.ping_renderer.updateRangeUpperValue(i, self.ping_min + second)
-                    if range_obj.label() == 'Green':
-                        self.ping_renderer.updateRangeLowerValue(i, self.ping_min + second)
-                        self.ping_renderer.updateRangeUpperValue(i, self.ping_min + third)
-                    if range_obj.label() == 'Yellow':
-                        self.ping_renderer.updateRangeLowerValue(i, self.ping_min + third)
-                        self.ping_renderer.updateRangeUpperValue(i, self.ping_min + fourth)
-                    if range_obj.label() == 'Orange':
-                        self.ping_renderer.updateRangeLowerValue(i, self.ping_min +fourth)
-                        self.ping_renderer.updateRangeUpperValue(i, self.ping_min + fifth)
-                    if range_obj.label() == 'ORed':
-                        self.ping_renderer.updateRangeLowerValue(i, self.ping_min +fifth)
-                        self.ping_renderer.updateRangeUpperValue(i, self.ping_min + sixth)
-                    if range_obj.label() == 'Red':
-                        self.ping_renderer.updateRangeLowerValue(i, self.ping_min + sixth)
-                        self.ping_renderer.updateRangeUpperValue(i, self.ping_max)
-
-            vpr = self.ping_layer.dataProvider()
-
-            #Create new ping point
-            pnt = QgsGeometry.fromPointXY(point)
+        change = False
+        batch_min = min(powers)
+        batch_max = max(powers)
+        if batch_min < self.ping_min:
+            change = True
+            self.ping_min = batch_min
+        if batch_max > self.ping_max:
+            change = True
+            self.ping_max = batch_max
+        if (self.ping_max == self.ping_min):
+            self.ping_max = self.ping_max + 1
+        if change:
+            # Hold canvas redraws until every range has been moved; the
+            # flush scheduled below repaints the ping layer once
+            self.canvas.freeze(True)
+            r = self.ping_max - self.ping_min
+            range_index = {range_obj.label(): i for i, range_obj in
+                           enumerate(self.ping_renderer.ranges())}
+            for label, lower, upper in _PING_RANGE_FRACTIONS:
+                i = range_index.get(label)
+                if i is None:
+                    continue
+                self.ping_renderer.updateRangeLowerValue(
+                        i, self.ping_min + r * lower)
+                self.ping_renderer.updateRangeUpperValue(
+                        i, self.ping_min + r * upper)
+            self.canvas.freeze(False)
+
+        fields = self.ping_fields
+
+        #Create new ping points
+        features = []
+        lats, lons = zip(*coords)
+        points = web_mercator_points(lats, lons)
+        for point, power in zip(points, powers):
             feature = QgsFeature()
-            feature.setFields(self.ping_layer.fields())
-            feature.setGeometry(pnt)
+            feature.setFields(fields)
+            feature.setGeometry(QgsGeometry.fromPointXY(point))
             feature.setAttribute(0, power)
-            vpr.addFeatures([feature])
+            features.append(feature)
+        self.__ping_buffer.extend(features)
+        self.__schedule_flush()
+
+    def __schedule_flush(self):
+        '''
+        Starts the flush timer if a flush is not already pending, so that a
+        burst of new features is committed together
+        '''
+        if not self.__flush_timer.isActive():
+            self.__flush_timer.start()
+
+    def flush(self):
+        '''
+        Commits the buffered ping and vehicle path features to their layers
+        and updates the extents of the layers changed since the last flush
+        '''
+        self.__flush_timer.stop()
+        for layer in self.__stale_extents:
+            layer.updateExtents()
+        self.__stale_extents.clear()
+        if self.__ping_buffer and self.ping_layer is not None:
+            self.ping_layer.dataProvider().addFeatures(self.__ping_buffer)
             self.ping_layer.updateExtents()
+            self.ping_layer.triggerRepaint()
+        self.__ping_buffer = []
+        if self.__path_buffer and self.vehicle_path is not None:
+            lpr = self.vehicle_path.dataProvider()
+            _, added = lpr.addFeatures(self.__path_buffer)
+            merged = set()
+            for vehicle_data, feature in zip(self.__path_owners, added):
+                vehicle_data.path_ids.append(feature.id())
+                if len(vehicle_data.path_ids) >= _PATH_MERGE_SIZE:
+                    merged.add(vehicle_data)
+            for vehicle_data in merged:
+                self.__merge_path(lpr, vehicle_data)
+            self.vehicle_path.updateExtents()
+            self.vehicle_path.triggerRepaint()
+        self.__path_buffer = []
+        self.__path_owners = []
+
+    @staticmethod
+    def __merge_path(lpr, vehicle_data):
+        '''
+        Replaces a vehicle's unmerged path segments with a single polyline
+        feature so that the path layer holds few, long features
+        Args:
+            lpr: The vehicle path layer's data provider
+            vehicle_data: The VehicleData whose segments are merged
+        '''
+        feature = QgsFeature()
+        feature.setGeometry(
+                QgsGeometry.fromPolylineXY(vehicle_data.path_points))
+        lpr.addFeatures([feature])
+        lpr.deleteFeatures(vehicle_data.path_ids)
+        vehicle_data.path_points = [vehicle_data.path_points[-1]]
+        vehicle_data.path_ids = []
 
     def plot_estimate(self, coord, frequency):
         '''
@@ -602,17 +942,17 @@ class MapWidget(QWidget):
 
         if self.estimate is None:
             return
+        vpr = self.estimate.dataProvider()
         if self.ind_est > 0:
-            self.estimate.startEditing()
-            self.estimate.deleteFeature(self.ind_est)
-            self.estimate.commitChanges()
+            vpr.deleteFeatures([self.ind_est])
 
-        vpr = self.estimate.dataProvider()
         pnt = QgsGeometry.fromPointXY(point)
         feature = QgsFeature()
         feature.setGeometry(pnt)
         vpr.addFeatures([feature])
-        self.estimate.updateExtents()
+        self.__stale_extents.add(self.estimate)
+        self.__schedule_flush()
+        self.estimate.triggerRepaint()
         self.ind_est = self.ind_est + 1
 
 class MapOptions(QWidget):
@@ -624,14 +964,16 @@ class MapOptions(QWidget):
         Creates a MapOptions widget
         '''
         QWidget.__init__(self)
+        self.__log = logging.getLogger('rctGCS.MapOptions')
 
         self.map_widget = None
         self.btn_cache_map = None
         self.is_web_map = False
         self.lbl_dist = None
         self.__create_widgets()
-        self.created = False
+        self.results_file = None
         self.writer = None
+        self.__results_rows = 0
         self.has_point = False
         self.user_pops = UserPopups()
 
@@ -713,11 +1055,9 @@ class MapOptions(QWidget):
                     "No specified area to cache!")
                 self.map_widget.rect()
             else:
-                cache_thread = Thread(target=self.map_widget.cache_map)
-                cache_thread.start()
-                self.map_widget.canvas.refresh()
+                self.map_widget.cache_map()
         else:
-            print("alert")
+            self.__log.warning('Only web maps can be cached')
 
     def set_map(self, map_widget: MapWidget, is_web_map):
         '''
@@ -778,24 +1118,32 @@ class MapOptions(QWidget):
 
         dist = self.distance(lat1, lat2, lon1, lon2)
 
-        if not self.created:
-            with open('results.csv', 'w', newline='') as csvfile:
-                field_names = ['Distance', 'res.x', 'residuals']
-                self.writer = csv.DictWriter(csvfile, fieldnames=field_names)
-                self.writer.writeheader()
-                self.created = True
-                self.writer.writerow({'Distance': str(dist),
-                    'res.x': str(res.x), 'residuals': str(res.fun)})
-        else:
-            with open('results.csv', 'a+', newline='') as csvfile:
-                field_names = ['Distance', 'res.x', 'residuals']
-                self.writer = csv.DictWriter(csvfile, fieldnames=field_names)
-                self.writer.writerow({'Distance': str(dist),
-                    'res.x': str(res.x), 'residuals': str(res.fun)})
+        # The results file stays open for the session and is flushed
+        # every few rows rather than reopened for each estimate
+        if self.results_file is None:
+            self.results_file = open('results.csv', 'w', newline='')
+            field_names = ['Distance', 'res.x', 'residuals']
+            self.writer = csv.DictWriter(self.results_file,
+                                         fieldnames=field_names)
+            self.writer.writeheader()
+        self.writer.writerow({'Distance': str(dist),
+            'res.x': str(res.x), 'residuals': str(res.fun)})
+        self.__results_rows += 1
+        if self.__results_rows % 10 == 0:
+            self.results_file.flush()
 
         d = '%.3f'%(dist)
         self.lbl_dist.setText(d + '(m.)')
 
+    def close_results(self):
+        '''
+        Flushes and closes the estimate distance results file
+        '''
+        if self.results_file is not None:
+            self.results_file.close()
+            self.results_file = None
+            self.writer = None
+
     def distance(self, lat1, lat2, lon1, lon2):
         '''
         Helper function to calculate distance
@@ -805,22 +1153,7 @@ class MapOptions(QWidget):
             lon1: float value indicating the long value of a point
             lon2: float value indicating the long value of a second point
         '''
-        lon1 = math.radians(lon1)
-        lon2 = math.radians(lon2)
-        lat1 = math.radians(lat1)
-        lat2 = math.radians(lat2)
-
-        # Haversine formula
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
-
-        c = 2 * math.asin(math.sqrt(a))
-
-        # Radius of earth in kilometers. Use 3956 for miles
-        r = 6371
-
-        return(c * r * 1000)
+        return haversine(lat1, lat2, lon1, lon2)
 
     def export_ping(self):
         '''
@@ -835,6 +1168,7 @@ class MapOptions(QWidget):
         options = QgsVectorFileWriter.SaveVectorOptions()
         options.driverName = "ESRI Shapefile"
 
+        self.map_widget.flush()
         QgsVectorFileWriter.writeAsVectorFormatV2(self.map_widget.ping_layer,
                                 file, QgsCoordinateTransformContext(), options)
 
@@ -851,6 +1185,7 @@ class MapOptions(QWidget):
         options = QgsVectorFileWriter.SaveVectorOptions()
         options.driverName = "ESRI Shapefile"
 
+        self.map_widget.flush()
         QgsVectorFileWriter.writeAsVectorFormatV2(self.map_widget.vehicle_path,
                                 file, QgsCoordinateTransformContext(), options)
 
@@ -868,25 +1203,29 @@ class MapOptions(QWidget):
             self.user_pops.show_warning("Use the polygon tool to choose an area on the map to export", "No specified area to export!")
             self.map_widget.polygon()
         else:
-            vpr = self.map_widget.polygon_layer.dataProvider()
             points = self.map_widget.tool_polygon.vertices
-            print(type(points[0]))
-            polyGeom = QgsGeometry.fromPolygonXY([points])
-
             feature = QgsFeature()
-            feature.setGeometry(polyGeom)
-            vpr.addFeatures([feature])
-            self.map_widget.polygon_layer.updateExtents()
+            feature.setGeometry(QgsGeometry.fromPolygonXY([points]))
 
             folder = str(QFileDialog.getExistingDirectory(self, "Select Directory"))
             file = folder + '/polygon.shp'
             options = QgsVectorFileWriter.SaveVectorOptions()
             options.driverName = "ESRI Shapefile"
 
-            QgsVectorFileWriter.writeAsVectorFormatV2(
-                                self.map_widget.polygon_layer, file,
-                                QgsCoordinateTransformContext(), options)
-            vpr.truncate()
+            # The vertices are in the canvas' coordinates, so the feature
+            # is written straight to the file in that CRS
+            writer = QgsVectorFileWriter.create(file, QgsFields(),
+                    QgsWkbTypes.Polygon,
+                    self.map_widget.canvas.mapSettings().destinationCrs(),
+                    QgsCoordinateTransformContext(), options)
+            if writer.hasError() != QgsVectorFileWriter.NoError:
+                self.__log.error('Failed to export polygon: %s',
+                                 writer.errorMessage())
+                self.user_pops.show_warning("Failed to export polygon.")
+            else:
+                writer.addFeature(feature)
+            # Deleting the writer flushes and closes the file
+            del writer
 
     def export_cone(self):
         '''
@@ -921,7 +1260,12 @@ class WebMap(MapWidget):
         '''
         # Initialize WebMapFrame
         MapWidget.__init__(self, root)
+        self.__log = logging.getLogger('rctGCS.WebMap')
         self.load_cached = load_cached
+        self.__cache_task = None
+        self.__tile_session = requests.Session()
+        self.__tile_session.headers['User-agent'] = _TILE_USER_AGENT
+        self.__tile_limiter = TileRateLimiter(_TILE_REQUEST_RATE)
 
         self.add_layers()
 
@@ -951,8 +1295,6 @@ class WebMap(MapWidget):
         symbol = QgsMarkerSymbol.createSimple({'name':'diamond',
                 'color':'blue'})
         layer.renderer().setSymbol(symbol)
-        layer.setAutoRefreshInterval(500)
-        layer.setAutoRefreshEnabled(True)
 
         return layer
 
@@ -977,6 +1319,8 @@ class WebMap(MapWidget):
         uri_line = "Linestring?crs=epsg:3857"
         vehicle_layer = QgsVectorLayer(uri, 'Vehicle', "memory")
         vehicle_path_layer = QgsVectorLayer(uri_line, 'vehicle_path', "memory")
+        simplify_on_render(vehicle_path_layer)
+        vehicle_path_layer.dataProvider().createSpatialIndex()
 
         # Set drone image for marker symbol
         path = QDir().filePath('../resources/vehicleSymbol.svg')
@@ -987,11 +1331,7 @@ class WebMap(MapWidget):
         symbol_svg.setStrokeWidth(1)
         vehicle_layer.renderer().symbol().changeSymbolLayer(0, symbol_svg)
 
-        #set autorefresh
-        vehicle_layer.setAutoRefreshInterval(500)
-        vehicle_layer.setAutoRefreshEnabled(True)
-        vehicle_path_layer.setAutoRefreshInterval(500)
-        vehicle_path_layer.setAutoRefreshEnabled(True)
+        # no auto refresh, plot_vehicle and flush repaint on new data
         return vehicle_layer, vehicle_path_layer
 
     def set_up_cone_layer(self):
@@ -1031,94 +1371,46 @@ class WebMap(MapWidget):
         Sets up the ping layer and renderer.
         Args:
         '''
-        ranges = []
         uri = "Point?crs=epsg:3857"
         layer = QgsVectorLayer(uri, 'Pings', 'memory')
 
-        # make symbols
-        symbol_blue = QgsSymbol.defaultSymbol(layer.geometryType())
-        symbol_blue.setColor(QColor('#0000FF'))
-
-        symbol_cyan = QgsSymbol.defaultSymbol(layer.geometryType())
-        symbol_cyan.setColor(QColor('#00FFFF'))
-
-        symbol_green = QgsSymbol.defaultSymbol(layer.geometryType())
-        symbol_green.setColor(QColor('#00FF00'))
-
-        symbol_yellow = QgsSymbol.defaultSymbol(layer.geometryType())
-        symbol_yellow.setColor(QColor('#FFFF00'))
-
-        symbol_orange = QgsSymbol.defaultSymbol(layer.geometryType())
-        symbol_orange.setColor(QColor('#FFC400'))
-
-        symbol_orange_red = QgsSymbol.defaultSymbol(layer.geometryType())
-        symbol_orange_red.setColor(QColor('#FFA000'))
-
-        symbol_red = QgsSymbol.defaultSymbol(layer.geometryType())
-        symbol_red.setColor(QColor('#FF0000'))
-
-        # make ranges
-        range_blue = QgsRendererRange(0, 10, symbol_blue, 'Blue')
-        range_cyan = QgsRendererRange(10, 20, symbol_cyan, 'Cyan')
-        range_green = QgsRendererRange(20, 40, symbol_green, 'Green')
-        range_yellow = QgsRendererRange(40, 60, symbol_yellow, 'Yellow')
-        range_orange = QgsRendererRange(60, 80, symbol_orange, 'Orange')
-        range_orange_red = QgsRendererRange(80, 90, symbol_orange_red, 'ORed')
-        range_red = QgsRendererRange(90, 100, symbol_red, 'Red')
-        ranges.append(range_blue)
-        ranges.append(range_cyan)
-        ranges.append(range_green)
-        ranges.append(range_yellow)
-        ranges.append(range_orange)
-        ranges.append(range_orange_red)
-        ranges.append(range_red)
+        # make one symbol per range from the shared default symbol
+        base_symbol = default_point_symbol()
+        ranges = [QgsRendererRange(lower, upper,
+                                   _make_symbol(base_symbol, color), label)
+                  for lower, upper, color, label in _PING_RANGES]
 
         # set renderer to set symbol based on amplitude
         ping_renderer = QgsGraduatedSymbolRenderer('Amp', ranges)
 
-        style = QgsStyle.defaultStyle()
-        default_color_ramp_names = style.colorRampNames()
-        ramp = style.colorRamp(default_color_ramp_names[22])
-        ping_renderer.setSourceColorRamp(ramp)
-        ping_renderer.setSourceSymbol( QgsSymbol.defaultSymbol(
-                                            layer.geometryType()))
+        ping_renderer.setSourceColorRamp(ping_color_ramp().clone())
+        ping_renderer.setSourceSymbol(base_symbol.clone())
         ping_renderer.sortByValue()
 
         vpr = layer.dataProvider()
         vpr.addAttributes([QgsField(name='Amp', type=QVariant.Double, len=30)])
         layer.updateFields()
 
-        # set the renderer and allow the map_layer to auto refresh
+        # set the renderer, flush repaints the layer on new pings
         layer.setRenderer(ping_renderer)
-        layer.setAutoRefreshInterval(500)
-        layer.setAutoRefreshEnabled(True)
 
         return layer, ping_renderer
 
     def set_up_precision_layer(self):
-        path = QDir().currentPath()
-        uri = 'file:///' + path + \
-            '/holder/query.csv?encoding=%s&delimiter=%s&xField=%s&yField=%s&crs=%s&value=%s' \
-            % ("UTF-8",",", "easting", "northing","epsg:32611", "value")
+        uri = _PRECISION_URI_TEMPLATE.format(path=QDir().currentPath())
 
         csv_layer= QgsVectorLayer(uri, "query", "delimitedtext")
         csv_layer.setOpacity(0.5)
 
-        heat_map = Qgsheat_mapRenderer()
+        heat_map = QgsHeatmapRenderer()
         heat_map.setWeightExpression('value')
         heat_map.setRadiusUnit(QgsUnitTypes.RenderUnit.RenderMetersInMapUnits)
         heat_map.setRadius(3)
         csv_layer.setRenderer(heat_map)
 
-        csv_layer.setAutoRefreshInterval(500)
-        csv_layer.setAutoRefreshEnabled(True)
+        # no auto refresh, plot_precision reloads the layer on new data
         return csv_layer
 
-    def set_up_polygon_layer(self):
-        uri = "Polygon?crs=epsg:3857"
-        polygon_point_layer = QgsVectorLayer(uri, 'Polygon', "memory")
-        return polygon_point_layer
-
     def add_layers(self):
         '''
         Helper method to add map layers to map canvas
@@ -1131,6 +1423,7 @@ class WebMap(MapWidget):
 
         if self.ping_layer is None:
             self.ping_layer, self.ping_renderer = self.set_up_ping_layer()
+            self.ping_fields = self.ping_layer.fields()
 
         if self.ground_truth is None:
             self.ground_truth = self.set_up_ground_truth()
@@ -1138,9 +1431,6 @@ class WebMap(MapWidget):
         if self.cones is None:
             self.cones = self.set_up_cone_layer()
 
-        if self.polygon_layer is None:
-            self.polygon_layer = self.set_up_polygon_layer()
-
         #load from cached tiles if true, otherwise loads from web
         if self.load_cached:
             path = QDir().currentPath()
@@ -1149,31 +1439,23 @@ class WebMap(MapWidget):
         else:
             url_with_params = 'type=xyz&url=http://a.tile.openstreetmap.org/%7Bz%7D/%7Bx%7D/%7By%7D.png&zmax=19&zmin=0&crs=EPSG3857'
         self.map_layer = QgsRasterLayer(url_with_params, 'OpenStreetMap', 'wms')
-        '''
-        if self.precision is None:
+        if self.enable_precision and self.precision is None:
             self.precision = self.set_up_precision_layer()
-            dest_crs = self.map_layer.crs()
-            raster_crs = self.precision.crs()
-            self.precision.setCrs(raster_crs)
-            self.canvas.setDestinationCrs(dest_crs)
-        '''
+
         if self.map_layer.isValid():
-            crs = self.map_layer.crs()
-            crs.createFromString("EPSG:3857")
-            self.map_layer.setCrs(crs)
-
-            #add all layers to map
-            QgsProject.instance().addMapLayer(self.map_layer)
-            QgsProject.instance().addMapLayer(self.ground_truth)
-            QgsProject.instance().addMapLayer(self.estimate)
-            QgsProject.instance().addMapLayer(self.vehicle)
-            QgsProject.instance().addMapLayer(self.vehicle_path)
-            QgsProject.instance().addMapLayer(self.ping_layer)
-            QgsProject.instance().addMapLayer(self.cones)
-            #QgsProject.instance().add_map_layer(self.precision)
-            print('valid map_layer')
+            self.map_layer.setCrs(web_mercator_crs())
+
+            #add all layers to map in one batch, so the project emits a
+            #single layersAdded signal
+            layers = [self.map_layer, self.ground_truth, self.estimate,
+                      self.vehicle, self.vehicle_path, self.ping_layer,
+                      self.cones]
+            if self.precision is not None:
+                layers.append(self.precision)
+            QgsProject.instance().addMapLayers(layers)
+            self.__log.debug('Map layer loaded')
         else:
-            print('invalid map_layer')
+            self.__log.error('Invalid map layer')
             raise RuntimeError
 
     def add_rect_tool(self):
@@ -1203,47 +1485,84 @@ class WebMap(MapWidget):
             lon_deg: float longitude value
             zoom: integer zoom value
         '''
-        lat_rad = math.radians(lat_deg)
-        n = 2.0 ** zoom
-        x = int((lon_deg + 180.0) / 360.0 * n)
-        y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
-        return (x,y)
+        x, y = tile_numbers(lat_deg, lon_deg, zoom)
+        return (int(x), int(y))
 
     def cache_map(self):
         '''
-        Function to facilitate caching map tiles
+        Function to facilitate caching map tiles.  The selected area is read
+        here, the tiles are downloaded on the QGIS task pool and the canvas
+        is refreshed once the task finishes.
         '''
         if (self.tool_rect.rectangle() == None):
             return
-        else:
-            rect = self.tool_rect.rectangle()
-            r = self.transform.transformBoundingBox(self.tool_rect.rectangle(),
-                                QgsCoordinateTransform.ForwardTransform, True)
-            print("Rectangle:", r.xMinimum(), r.yMinimum(),
-                                r.xMaximum(), r.yMaximum() )
-            if (r != None):
-                zoom_start = 17
-                tile_count = 0
-                for zoom in range(zoom_start, 19, 1):
-                    x_min, y_min = self.degree_to_tile_num(
-                            float(r.yMinimum()), float(r.xMinimum()), zoom)
-                    x_max, y_max = self.degree_to_tile_num(
-                            float(r.yMaximum()), float(r.xMaximum()), zoom)
-                    print("Zoom:", zoom)
-                    print(x_min, x_max, y_min, y_max)
-                    for x in range(x_min, x_max + 1, 1):
-                        for y in range(y_max, y_min + 1, 1):
-                            if (tile_count < 200):
-                                time.sleep(1)
-                                downloaded = self.download_tile(x, y, zoom)
-                                if downloaded:
-                                    tile_count = tile_count + 1
-                            else:
-                                print("Tile count exceeded, please try again in a few minutes")
-                                return
-                print("Download Complete")
-            else:
-                print("Download Failed")
+        if self.__cache_task is not None:
+            self.__log.warning('Map caching already in progress')
+            return
+        r = self.transform.transformBoundingBox(self.tool_rect.rectangle(),
+                            QgsCoordinateTransform.ForwardTransform, True)
+        self.__log.debug('Caching rectangle: %f %f %f %f', r.xMinimum(),
+                         r.yMinimum(), r.xMaximum(), r.yMaximum())
+        self.__cache_task = QgsTask.fromFunction('Cache map tiles',
+                self.__download_tiles, float(r.yMinimum()),
+                float(r.xMinimum()), float(r.yMaximum()),
+                float(r.xMaximum()), on_finished=self.__tiles_cached)
+        QgsApplication.taskManager().addTask(self.__cache_task)
+
+    def __download_tiles(self, task, lat_min, lon_min, lat_max, lon_max):
+        '''
+        QgsTask function to download the tiles covering an area
+        Args:
+            task: The running QgsTask
+            lat_min: Southern edge of the area
+            lon_min: Western edge of the area
+            lat_max: Northern edge of the area
+            lon_max: Eastern edge of the area
+        Returns:
+            Number of tiles downloaded
+        '''
+        zoom_start = 17
+        tiles = []
+        for zoom in range(zoom_start, 19, 1):
+            (x_min, x_max), (y_min, y_max) = tile_numbers(
+                    [lat_min, lat_max], [lon_min, lon_max], zoom)
+            self.__log.debug('Zoom %d tiles: x %d-%d, y %d-%d', zoom,
+                             x_min, x_max, y_max, y_min)
+            # North is the smaller tile row
+            xs, ys = np.meshgrid(np.arange(x_min, x_max + 1),
+                                 np.arange(y_max, y_min + 1), indexing='ij')
+            for x, y in zip(xs.ravel().tolist(), ys.ravel().tolist()):
+                if not os.path.isfile("tiles/%d/%d/%d.png" % (zoom, x, y)):
+                    tiles.append((x, y, zoom))
+        if len(tiles) > _TILE_LIMIT:
+            self.__log.warning(
+                'Tile count exceeded, please try again in a few minutes')
+            tiles = tiles[:_TILE_LIMIT]
+
+        def download(tile):
+            if task.isCanceled():
+                return False
+            return self.download_tile(*tile)
+
+        # Requests overlap on a shared keep-alive session while the rate
+        # limiter keeps the overall request rate polite
+        with ThreadPoolExecutor(max_workers=_TILE_WORKERS) as executor:
+            tile_count = sum(executor.map(download, tiles))
+        self.__log.info('Downloaded %d tiles', tile_count)
+        return tile_count
+
+    def __tiles_cached(self, exception, result=None):
+        '''
+        Internal callback for when the tile caching task has finished
+        Args:
+            exception: Exception raised by the task, if any
+            result: Number of tiles downloaded
+        '''
+        self.__cache_task = None
+        if exception is not None:
+            self.__log.error('Tile download failed: %s', exception)
+            return
+        self.canvas.refresh()
 
     def download_tile(self, x_tile, y_tile, zoom):
         '''
@@ -1251,26 +1570,28 @@ class WebMap(MapWidget):
         '''
         url = "http://c.tile.openstreetmap.org/%d/%d/%d.png" % \
             (zoom, x_tile, y_tile)
-        dir_path = "tiles/%d/%d/" % (zoom, x_tile)
-        download_path = "tiles/%d/%d/%d.png" % (zoom, x_tile, y_tile)
-
-        if not os.path.exists(dir_path):
-            os.makedirs(dir_path)
-
-        if(not os.path.isfile(download_path)):
-            print("downloading %r" % url)
-            # requires up to date user agent
-            source = requests.get(url, headers = {'User-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/101.0.4951.54 Safari/537.36'})
-            cont = source.content
-            source.close()
-            destination = open(download_path,'wb')
-            destination.write(cont)
-            destination.close()
-            return True
-        else:
-            print("skipped %r" % url)
+        download_path = Path("tiles/%d/%d/%d.png" % (zoom, x_tile, y_tile))
+
+        if download_path.is_file():
+            self.__log.debug('Skipped %r', url)
             return False
 
+        download_path.parent.mkdir(parents=True, exist_ok=True)
+        self.__log.debug('Downloading %r', url)
+        self.__tile_limiter.acquire()
+        # Stream into a sibling file and rename it into place, so that an
+        # interrupted download never leaves a partial tile that later loads
+        # would take as cached
+        tmp_path = download_path.with_name(download_path.name + '.tmp')
+        with self.__tile_session.get(url, stream=True) as source:
+            if not source.ok:
+                self.__log.warning('Tile request %r failed: %d', url,
+                                   source.status_code)
+                return False
+            with open(tmp_path, 'wb') as tile_file:
+                for chunk in source.iter_content(_TILE_CHUNK_SIZE):
+                    tile_file.write(chunk)
+        os.replace(tmp_path, download_path)
         return True
 
 class StaticMap(MapWidget):
@@ -1284,6 +1605,7 @@ class StaticMap(MapWidget):
             root: the root widget of the application
         '''
         MapWidget.__init__(self, root)
+        self.__log = logging.getLogger('rctGCS.StaticMap')
 
         self.file_name = None
         self.__get_file_name()
@@ -1316,7 +1638,7 @@ class StaticMap(MapWidget):
         self.map_layer = QgsRasterLayer(self.file_name[0], "SRTM layer name")
         if not self.map_layer.crs().isValid():
             raise FileNotFoundError("Invalid file, loading from web...")
-        print(self.map_layer.crs())
+        self.__log.debug('Static map CRS: %s', self.map_layer.crs().authid())
 
         if self.estimate is None:
             uri = "Point?crs=epsg:4326"
@@ -1326,15 +1648,14 @@ class StaticMap(MapWidget):
                                                     'color': 'blue'})
             self.estimate.renderer().setSymbol(symbol)
 
-            self.estimate.setAutoRefreshInterval(500)
-            self.estimate.setAutoRefreshEnabled(True)
-
         if self.vehicle is None:
             uri = "Point?crs=epsg:4326"
             uri_line = "Linestring?crs=epsg:4326"
 
             self.vehicle = QgsVectorLayer(uri, 'Vehicle', "memory")
             self.vehicle_path = QgsVectorLayer(uri_line, 'vehicle_path', "memory")
+            simplify_on_render(self.vehicle_path)
+            self.vehicle_path.dataProvider().createSpatialIndex()
 
             # Set drone image for marker symbol
             path = QDir().currentPath()
@@ -1346,46 +1667,16 @@ class StaticMap(MapWidget):
             symbol_svg.setStrokeWidth(1)
 
             self.vehicle.renderer().symbol().changeSymbolLayer(0, symbol_svg )
-            #set autorefresh
-            self.vehicle.setAutoRefreshInterval(500)
-            self.vehicle.setAutoRefreshEnabled(True)
-            self.vehicle_path.setAutoRefreshInterval(500)
-            self.vehicle_path.setAutoRefreshEnabled(True)
 
         if self.ping_layer is None:
-            ranges = []
             uri = "Point?crs=epsg:4326"
             self.ping_layer = QgsVectorLayer(uri, 'Pings', 'memory')
 
-            # make symbols
-            symbol_blue = QgsSymbol.defaultSymbol(
-                    self.ping_layer.geometryType())
-            symbol_blue.setColor(QColor('#0000FF'))
-            symbol_green = QgsSymbol.defaultSymbol(
-                    self.ping_layer.geometryType())
-            symbol_green.setColor(QColor('#00FF00'))
-            symbol_yellow = QgsSymbol.defaultSymbol(
-                    self.ping_layer.geometryType())
-            symbol_yellow.setColor(QColor('#FFFF00'))
-            symbol_orange = QgsSymbol.defaultSymbol(
-                    self.ping_layer.geometryType())
-            symbol_orange.setColor(QColor('#FFA500'))
-            symbol_red = QgsSymbol.defaultSymbol(
-                    self.ping_layer.geometryType())
-            symbol_red.setColor(QColor('#FF0000'))
-
-            # make ranges
-            range_blue = QgsRendererRange(0, 20, symbol_blue, 'Blue')
-            range_green = QgsRendererRange(20, 40, symbol_green, 'Green')
-            range_yellow = QgsRendererRange(40, 60, symbol_yellow, 'Yellow')
-            range_orange = QgsRendererRange(60, 80, symbol_orange, 'Orange')
-            range_red = QgsRendererRange(80, 100, symbol_red, 'Red')
-
-            ranges.append(range_blue)
-            ranges.append(range_green)
-            ranges.append(range_yellow)
-            ranges.append(range_orange)
-            ranges.append(range_red)
+            # make one symbol per range from the shared default symbol
+            base_symbol = default_point_symbol()
+            ranges = [QgsRendererRange(lower, upper,
+                                       _make_symbol(base_symbol, color), label)
+                      for lower, upper, color, label in _STATIC_PING_RANGES]
 
             # set renderer to set symbol based on amplitude
             self.ping_renderer = QgsGraduatedSymbolRenderer('Amp', ranges)
@@ -1395,18 +1686,15 @@ class StaticMap(MapWidget):
             vpr = self.ping_layer.dataProvider()
             vpr.addAttributes([QgsField(name='Amp', type=QVariant.Double, len=30)])
             self.ping_layer.updateFields()
+            self.ping_fields = self.ping_layer.fields()
 
-            # set the renderer and allow the layerayer to auto refresh
+            # set the renderer, flush repaints the layer on new pings
             self.ping_layer.setRenderer(self.ping_renderer)
-            self.ping_layer.setAutoRefreshInterval(500)
-            self.ping_layer.setAutoRefreshEnabled(True)
 
         if self.map_layer.isValid():
-            QgsProject.instance().add_map_layer(self.map_layer)
-            QgsProject.instance().add_map_layer(self.estimate)
-            QgsProject.instance().add_map_layer(self.vehicle)
-            QgsProject.instance().add_map_layer(self.vehicle_path)
-            QgsProject.instance().add_map_layer(self.ping_layer)
-            print('valid layer')
+            QgsProject.instance().addMapLayers([self.map_layer,
+                    self.estimate, self.vehicle, self.vehicle_path,
+                    self.ping_layer])
+            self.__log.debug('Map layer loaded')
         else:
-            print('invalid layer')
+            self.__log.error('Invalid map layer')
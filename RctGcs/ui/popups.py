@@ -14,6 +14,9 @@ class UserPopups:
     """
     Creates popup boxes for user display
     """
+    # Warning box shared by every UserPopups, built on first use
+    _warning_box = None
+
     def create_text_box(self, name: str, text: str) -> Any:
         '''
         Params:
@@ -76,14 +79,27 @@ class UserPopups:
             title: message header
             text: message body
         '''
-        msg = QMessageBox()
+        msg = self.__get_warning_box()
         msg.setText(title)
-        msg.setWindowTitle("Alert")
         msg.setInformativeText(text)
-        msg.setIcon(QMessageBox.Critical)
-        msg.addButton(QMessageBox.Ok)
         msg.exec_()
 
+    @classmethod
+    def __get_warning_box(cls):
+        '''
+        Returns the shared warning box, or a new box if the shared one is
+        already showing a warning
+        '''
+        msg = cls._warning_box
+        if msg is None or msg.isVisible():
+            msg = QMessageBox()
+            msg.setWindowTitle("Alert")
+            msg.setIcon(QMessageBox.Critical)
+            msg.addButton(QMessageBox.Ok)
+            if cls._warning_box is None:
+                cls._warning_box = msg
+        return msg
+
     def show_timed_warning(self, text: str, timeout: int, title: str ="Warning"):
         '''
         Creates timed warning popups
@@ -118,10 +134,18 @@ class ExpertSettingsDialog(QWizard):
         '''
         super(ExpertSettingsDialog, self).__init__(parent)
         self.parent = parent
-        self.addPage(ExpertSettingsDialogPage(self, option_vars))
+        self.__page = ExpertSettingsDialogPage(self, option_vars)
+        self.addPage(self.__page)
         self.setWindowTitle('Expert/Engineering Settings')
         self.resize(640,480)
 
+    def refresh(self):
+        '''
+        Refreshes the displayed settings from the vehicle, so that the
+        dialog can be shown again without being rebuilt
+        '''
+        self.__page.refresh()
+
 class ExpertSettingsDialogPage(QWizardPage):
     '''
     Custom DialogPage widget to facilitate user configured
@@ -140,7 +164,14 @@ class ExpertSettingsDialogPage(QWizardPage):
         self.user_pops = UserPopups()
         self.create_widget()
         # Configure member vars here
-        self.__parent.parent.updateGUIOptionVars(0xFF, self.option_vars)
+        self.refresh()
+
+    def refresh(self):
+        '''
+        Requests the current expert and engineering settings from the
+        vehicle to fill in the entries
+        '''
+        self.__parent.parent.update_gui_option_vars(0xFF, self.option_vars)
 
     def create_widget(self):
         '''
@@ -175,17 +206,17 @@ class ExpertSettingsDialogPage(QWizardPage):
         lbl_sys_auto_start = QLabel("SYS Autostart")
         exp_settings_frame.addWidget(lbl_sys_auto_start, 8, 0)
 
-        self.option_vars['DSP_pingWidth'] = QLineEdit()
-        exp_settings_frame.addWidget(self.option_vars['DSP_pingWidth'], 0, 1)
+        self.option_vars['DSP_ping_width'] = QLineEdit()
+        exp_settings_frame.addWidget(self.option_vars['DSP_ping_width'], 0, 1)
 
-        self.option_vars['DSP_pingMin'] = QLineEdit()
-        exp_settings_frame.addWidget(self.option_vars['DSP_pingMin'], 1, 1)
+        self.option_vars['DSP_ping_min'] = QLineEdit()
+        exp_settings_frame.addWidget(self.option_vars['DSP_ping_min'], 1, 1)
 
-        self.option_vars['DSP_pingMax'] = QLineEdit()
-        exp_settings_frame.addWidget(self.option_vars['DSP_pingMax'], 2, 1)
+        self.option_vars['DSP_ping_max'] = QLineEdit()
+        exp_settings_frame.addWidget(self.option_vars['DSP_ping_max'], 2, 1)
 
-        self.option_vars['DSP_pingSNR'] = QLineEdit()
-        exp_settings_frame.addWidget(self.option_vars['DSP_pingSNR'], 3, 1)
+        self.option_vars['DSP_ping_snr'] = QLineEdit()
+        exp_settings_frame.addWidget(self.option_vars['DSP_ping_snr'], 3, 1)
 
         self.option_vars['GPS_device'] = QLineEdit()
         exp_settings_frame.addWidget(self.option_vars['GPS_device'], 4, 1)
@@ -193,8 +224,8 @@ class ExpertSettingsDialogPage(QWizardPage):
         self.option_vars['GPS_baud'] = QLineEdit()
         exp_settings_frame.addWidget(self.option_vars['GPS_baud'], 5, 1)
 
-        self.option_vars['SYS_outputDir'] = QLineEdit()
-        exp_settings_frame.addWidget(self.option_vars['SYS_outputDir'], 6, 1)
+        self.option_vars['SYS_output_dir'] = QLineEdit()
+        exp_settings_frame.addWidget(self.option_vars['SYS_output_dir'], 6, 1)
 
         self.option_vars['GPS_mode'] = QLineEdit()
         exp_settings_frame.addWidget(self.option_vars['GPS_mode'], 7, 1)
@@ -221,7 +252,7 @@ class ExpertSettingsDialogPage(QWizardPage):
         if not self.validate_parameters():
             self.user_pops.show_warning(text="Entered information could not be validated")
             return
-        self.__parent.parent.submitGUIOptionVars(0xFF)
+        self.__parent.parent.submit_gui_option_vars(0xFF)
 
 class AddTargetDialog(QWizard):
     '''
@@ -271,6 +302,9 @@ class AddTargetDialogPage(QWizardPage):
     Custom DialogPage widget to facilitate user-added target
     frequencies
     '''
+    # Frequency entry validator shared by every page, built on first use
+    _freq_validator = None
+
     def __init__(self, parent, center_frequency: int, sampling_frequency: int):
         '''
         Creates a new AddTargetDialog
@@ -296,8 +330,6 @@ class AddTargetDialogPage(QWizardPage):
         '''
         Internal function to create widgets
         '''
-        regex_string  = QRegExp("[0-9]{30}")
-        val = QRegExpValidator(regex_string)
         frm_target_settings = QGridLayout()
 
         lbl_target_name = QLabel('Target Name:')
@@ -311,10 +343,20 @@ class AddTargetDialogPage(QWizardPage):
         frm_target_settings.addWidget(lbl_target_freq, 1, 0)
 
         self.targ_freq_entry = QLineEdit()
-        self.targ_freq_entry.setValidator(val)
+        self.targ_freq_entry.setValidator(self.__get_freq_validator())
         frm_target_settings.addWidget(self.targ_freq_entry, 1, 1)
         self.setLayout(frm_target_settings)
 
+    @classmethod
+    def __get_freq_validator(cls):
+        '''
+        Returns the shared frequency entry validator
+        '''
+        if cls._freq_validator is None:
+            # Up to 30 digits, the old pattern required exactly 30
+            cls._freq_validator = QRegExpValidator(QRegExp("[0-9]{1,30}"))
+        return cls._freq_validator
+
 class ConnectionDialog(QWizard):
     '''
     Custom Dialog widget to facilitate connecting to the drone
@@ -0,0 +1,38 @@
+'''Tests the map module's coordinate helpers
+'''
+import numpy as np
+import pytest
+
+from RctGcs.ui.map import haversine, tile_numbers
+
+# One degree of arc on the 6371 km sphere used by haversine
+ONE_DEGREE = 111194.92664455873
+
+
+def test_haversine():
+    """Test haversine on scalars and arrays against known arc lengths
+    """
+    assert haversine(0, 0, 0, 1) == pytest.approx(ONE_DEGREE)
+    assert haversine(0, 1, 0, 0) == pytest.approx(ONE_DEGREE)
+    assert haversine(0, 0, 0, 90) == pytest.approx(90 * ONE_DEGREE)
+    assert haversine(32.88, 32.88, -117.23, -117.23) == 0
+
+    distances = haversine(np.array([0, 0, 10]), np.array([0, 1, 10]),
+                          np.array([0, 0, 20]), np.array([90, 0, 20]))
+    np.testing.assert_allclose(distances, [90 * ONE_DEGREE, ONE_DEGREE, 0],
+                               atol=1e-6)
+
+
+def test_tile_numbers():
+    """Test tile_numbers on scalars and arrays against known slippy tiles
+    """
+    assert tile_numbers(0, 0, 0) == (0, 0)
+    assert tile_numbers(0, 0, 1) == (1, 1)
+    # UCSD, London and Sydney
+    assert tile_numbers(32.8801, -117.2340, 17) == (22852, 52847)
+    assert tile_numbers(51.5007, -0.1246, 12) == (2046, 1362)
+    assert tile_numbers(-33.8568, 151.2153, 10) == (942, 614)
+
+    x, y = tile_numbers([32.8801, 32.8701], [-117.2340, -117.2240], 17)
+    np.testing.assert_array_equal(x, [22852, 22856])
+    np.testing.assert_array_equal(y, [52847, 52852])
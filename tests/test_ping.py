@@ -0,0 +1,55 @@
+'''Tests that the vectorized estimator math matches the per-ping reference
+'''
+import numpy as np
+
+from RctGcs.ping import LocationEstimator, precisionKernel
+
+# X_rx, Y_rx, Z_rx, P_rx
+PINGS = np.array([
+    [500010.0, 3600005.0, 30.0, 61.0],
+    [499990.0, 3600012.0, 32.0, 58.5],
+    [500003.0, 3599985.0, 29.0, 60.2],
+    [500025.0, 3599998.0, 31.0, 55.1],
+    [499978.0, 3599993.0, 30.5, 57.8],
+    [500001.0, 3600001.0, 28.0, 66.4],
+])
+PARAMS = np.array([500002.0, 3600000.0, 95.0, 2.05])
+
+
+def test_residuals():
+    """Test __residuals against dToPrx applied one ping at a time
+    """
+    estimator = LocationEstimator()
+    expected = np.array([ping[3] - estimator.dToPrx(ping, PARAMS)
+                         for ping in PINGS])
+    actual = estimator._LocationEstimator__residuals(PARAMS, PINGS)
+    np.testing.assert_allclose(actual, expected, rtol=1e-12)
+
+
+def test_precision_kernel():
+    """Test precisionKernel against the per-pixel, per-ping p_d loop
+    """
+    estimator = LocationEstimator()
+    x_tx, y_tx, P_tx, n = PARAMS
+    refX = x_tx - 2.5
+    minY = y_tx - 2
+    xSize, ySize = 5, 4
+
+    distances = np.linalg.norm(PINGS[:, 0:3] - np.array([x_tx, y_tx, 0]),
+                               axis=1)
+    stdDistances = np.std(
+        estimator.RSSItoDistance(PINGS[:, 3], P_tx, n) - distances)
+    expected = np.ones((ySize, xSize)) / (xSize * ySize)
+    for y in range(ySize):
+        for x in range(xSize):
+            for ping in PINGS:
+                expected[y, x] *= estimator.p_d(
+                    np.array([x + refX, y + minY, 0]), ping[0:3], n,
+                    ping[3], P_tx, stdDistances)
+
+    heatMapArea, gridX, gridY = precisionKernel(
+        PINGS, x_tx, y_tx, P_tx, n, refX, minY, xSize, ySize)
+    assert heatMapArea.shape == (ySize, xSize)
+    np.testing.assert_allclose(heatMapArea, expected, rtol=1e-9)
+    np.testing.assert_array_equal(gridX[0], refX + np.arange(xSize))
+    np.testing.assert_array_equal(gridY[:, 0], minY + np.arange(ySize))